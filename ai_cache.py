@@ -0,0 +1,245 @@
+import itertools
+import logging
+import math
+import time
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime, timezone
+
+import db
+from config import CACHE_LRU_SIZE, CACHE_MAX_ENTRIES, CACHE_TTL_HOURS, CACHE_SIMILARITY_THRESHOLD
+from text_utils import MEANING_WORDS, normalize_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL = 3600  # как часто чистить просроченные записи, сек
+
+
+def _timestamp(created_at: str) -> float:
+    # CURRENT_TIMESTAMP в SQLite — это UTC без часового пояса
+    return datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc).timestamp()
+
+
+def cache_key(question: str, scope: str = "") -> str:
+    """Ключ кеша: нормализованный вопрос, для ответов с историей — с её отпечатком."""
+    key = normalize_text(question)
+    return f"{scope}|{key}" if scope else key
+
+
+# ===== TF-IDF индекс похожих вопросов =====
+class SimilarityIndex:
+    """Косинусная близость TF-IDF по обратному индексу.
+
+    Кандидаты набираются по самым редким терминам запроса: слова вроде
+    «банкротство» есть почти в каждом вопросе и дали бы в кандидаты весь
+    индекс. Нормы документов кешируются и пересчитываются, когда размер
+    индекса (а с ним и IDF) заметно изменился.
+    """
+
+    MAX_CANDIDATES = 200
+    NORMS_DRIFT = 0.1  # доля изменения размера индекса, после которой нормы устаревают
+
+    def __init__(self):
+        self._docs: dict[str, Counter] = {}
+        self._postings: dict[str, set[str]] = defaultdict(set)
+        self._norms: dict[str, float] = {}
+        self._norms_size = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, key: str):
+        self.remove(key)
+        terms = Counter(tokenize(key))
+        self._docs[key] = terms
+        for term in terms:
+            self._postings[term].add(key)
+
+    def remove(self, key: str):
+        terms = self._docs.pop(key, None)
+        if terms is None:
+            return
+        self._norms.pop(key, None)
+        for term in terms:
+            keys = self._postings[term]
+            keys.discard(key)
+            if not keys:
+                del self._postings[term]
+
+    def _idf(self, term: str) -> float:
+        return math.log((len(self._docs) + 1) / (len(self._postings.get(term, ())) + 1)) + 1
+
+    def _norm(self, key: str) -> float:
+        norm = self._norms.get(key)
+        if norm is None:
+            norm = self._norms[key] = math.sqrt(sum((count * self._idf(term)) ** 2
+                                                    for term, count in self._docs[key].items()))
+        return norm
+
+    def search(self, text: str) -> tuple[str | None, float]:
+        """Самый похожий вопрос и косинусная близость к нему."""
+        idf = {term: self._idf(term) for term in set(tokenize(text))}
+        query = {term: count * idf[term] for term, count in Counter(tokenize(text)).items()}
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+        if not query_norm:
+            return None, 0.0
+
+        if abs(len(self._docs) - self._norms_size) > self.NORMS_DRIFT * self._norms_size:
+            self._norms.clear()
+            self._norms_size = len(self._docs)
+
+        # Похожий вопрос почти наверняка содержит самые редкие слова запроса;
+        # частые добавляем, только пока кандидатов немного
+        candidates = set()
+        for term in sorted(query, key=lambda term: len(self._postings.get(term, ()))):
+            keys = self._postings.get(term, ())
+            if candidates and len(candidates) + len(keys) > self.MAX_CANDIDATES:
+                break
+            candidates.update(itertools.islice(keys, self.MAX_CANDIDATES))
+
+        markers = query.keys() & MEANING_WORDS
+        best_key, best_score = None, 0.0
+        for key in candidates:
+            doc = self._docs[key]
+            if doc.keys() & MEANING_WORDS != markers:
+                continue  # «можно ли не платить» не похож на «можно ли платить»
+            dot = sum(weight * doc[term] * idf[term] for term, weight in query.items() if term in doc)
+            score = dot / (query_norm * self._norm(key))
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key, best_score
+
+
+# ===== Многоуровневый кеш ответов =====
+class AnswerCache:
+    """LRU в памяти -> точное совпадение в SQLite -> похожий вопрос из индекса.
+
+    Ключ — нормализованный текст вопроса. Записи живут ttl секунд, в SQLite
+    хранится не больше max_entries самых свежих.
+
+    Ответы с учётом истории разговора (scope — отпечаток истории) лежат
+    только в LRU: они верны лишь для того же самого контекста, переживать
+    перезапуск и участвовать в поиске похожих вопросов им незачем.
+    """
+
+    def __init__(self, lru_size: int = CACHE_LRU_SIZE, max_entries: int = CACHE_MAX_ENTRIES,
+                 ttl: float = CACHE_TTL_HOURS * 3600, threshold: float = CACHE_SIMILARITY_THRESHOLD):
+        self.lru_size = lru_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lru: OrderedDict[str, tuple[str, float]] = OrderedDict()  # ключ -> (ответ, истекает)
+        self._entries: OrderedDict[str, float] = OrderedDict()  # все записи SQLite: вопрос -> истекает
+        self._index = SimilarityIndex() if threshold > 0 else None
+        self._last_purge = 0.0
+        self.hits = 0
+        self.db_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    async def load(self):
+        """Поднимает список живых записей из SQLite и строит индекс похожих вопросов."""
+        self._purge()
+        for question, created_at in await db.load_cache_index(self.ttl):
+            self._remember(question, _timestamp(created_at) + self.ttl)
+        self._evict_overflow()
+        logger.info("Кеш ИИ: загружено %d записей", len(self._entries))
+
+    async def get(self, question: str, scope: str = "") -> str | None:
+        key = cache_key(question, scope)
+        now = time.time()
+
+        cached = self._lru.get(key)
+        if cached and cached[1] > now:
+            self._lru.move_to_end(key)
+            self.hits += 1
+            return cached[0]
+        if scope:
+            self.misses += 1
+            return None
+
+        row = await db.get_cached_answer(key, self.ttl)
+        if row:
+            self.db_hits += 1
+            return self._to_lru(key, row)
+
+        if self._index is not None:
+            similar, score = self._index.search(key)
+            if similar is not None and score >= self.threshold and self._entries.get(similar, 0) > now:
+                # Свежий ответ может быть ещё в буфере записи, поэтому сначала смотрим LRU
+                cached = self._lru.get(similar)
+                if cached and cached[1] > now:
+                    self.near_hits += 1
+                    self._lru[key] = cached
+                    self._trim_lru()
+                    return cached[0]
+                row = await db.get_cached_answer(similar, self.ttl)
+                if row:
+                    self.near_hits += 1
+                    return self._to_lru(key, row)
+
+        self.misses += 1
+        return None
+
+    def put(self, question: str, answer: str, scope: str = ""):
+        key = cache_key(question, scope)
+        expires_at = time.time() + self.ttl
+        self._lru[key] = (answer, expires_at)
+        self._lru.move_to_end(key)
+        self._trim_lru()
+        if scope:
+            return
+        self._remember(key, expires_at)
+        db.save_cache(key, answer)
+        self._evict_overflow()
+        if time.time() - self._last_purge > PURGE_INTERVAL:
+            self._purge()
+
+    def stats(self) -> dict:
+        saved = self.hits + self.db_hits + self.near_hits
+        return {
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "saved_api_calls": saved,
+            "hit_rate": saved / (saved + self.misses) if saved + self.misses else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def _to_lru(self, key: str, row: tuple[str, str]) -> str:
+        answer, created_at = row
+        self._lru[key] = (answer, _timestamp(created_at) + self.ttl)
+        self._trim_lru()
+        return answer
+
+    def _trim_lru(self):
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _remember(self, key: str, expires_at: float):
+        self._entries[key] = expires_at
+        self._entries.move_to_end(key)
+        if self._index is not None:
+            self._index.add(key)
+
+    def _forget(self, key: str):
+        self._entries.pop(key, None)
+        self._lru.pop(key, None)
+        if self._index is not None:
+            self._index.remove(key)
+
+    def _evict_overflow(self):
+        while len(self._entries) > self.max_entries:
+            key = next(iter(self._entries))
+            self._forget(key)
+            db.delete_cache(key)
+
+    def _purge(self):
+        now = time.time()
+        self._last_purge = now
+        for key in [key for key, expires_at in self._entries.items() if expires_at <= now]:
+            self._forget(key)
+        db.delete_expired_cache(self.ttl)
+
+
+answer_cache = AnswerCache()
@@ -1,7 +1,23 @@
+import asyncio
+import logging
 import os
-import sqlite3
+import random
+import time
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import (
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    APIConnectionError,
+    InternalServerError,
+    RateLimitError,
+)
+from config import AI_MAX_CONCURRENCY, AI_TIMEOUT, AI_MAX_RETRIES, AI_RETRY_BACKOFF
+from ai_cache import answer_cache, cache_key
+from chat_history import history_key
+from rate_limit import deepseek_limiter, user_limiter, UserLimitExceeded
+from knowledge_base import knowledge_base
+from metrics import measure, AI_LATENCY, AI_ERRORS, AI_TTFT
 
 # ===== Загрузка .env =====
 load_dotenv()
@@ -12,73 +28,227 @@ DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 if not DEEPSEEK_API_KEY:
     raise ValueError("Не найден DEEPSEEK_API_KEY в окружении. Проверьте .env")
 
+logger = logging.getLogger(__name__)
+
 # ===== Инициализация клиента =====
-client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
-
-# ===== База данных =====
-DB_NAME = "bankruptcy_bot.db"
-
-# ===== Кеширование ответов =====
-def get_cached_answer(question: str):
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
-    cur.execute("CREATE TABLE IF NOT EXISTS ai_cache (question TEXT PRIMARY KEY, answer TEXT)")
-    cur.execute("SELECT answer FROM ai_cache WHERE question = ?", (question,))
-    row = cur.fetchone()
-    conn.close()
-    return row[0] if row else None
-
-def save_cache(question: str, answer: str):
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
-    cur.execute("INSERT OR REPLACE INTO ai_cache (question, answer) VALUES (?, ?)", (question, answer))
-    conn.commit()
-    conn.close()
+# Асинхронный клиент с общим пулом соединений: запросы к DeepSeek не блокируют
+# event loop бота, а число одновременных запросов к API ограничивает
+# deepseek_limiter.slot().
+client = AsyncOpenAI(
+    api_key=DEEPSEEK_API_KEY,
+    base_url=DEEPSEEK_BASE_URL,
+    timeout=AI_TIMEOUT,
+    max_retries=0,  # повторы делаем сами, с backoff
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=AI_MAX_CONCURRENCY,
+            max_keepalive_connections=AI_MAX_CONCURRENCY,
+        ),
+        timeout=AI_TIMEOUT,
+    ),
+)
+
+# Начало текста, который получает пользователь вместо ответа при ошибке API
+ERROR_PREFIX = "Ошибка DeepSeek AI: "
+
+def is_error_answer(answer: str) -> bool:
+    # В потоке ошибка может прийти после части ответа
+    return ERROR_PREFIX in answer
+
+# Ошибки, после которых имеет смысл повторить запрос
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+
+# Запросы к API, которые сейчас выполняются: ключ кеша -> задача.
+# Одинаковые вопросы с одинаковой историей, пришедшие одновременно, ждут один и тот же ответ.
+_in_flight: dict[str, asyncio.Future] = {}
+
+def _track_in_flight(key: str, future: asyncio.Future):
+    _in_flight[key] = future
+    future.add_done_callback(lambda f: _in_flight.pop(key) if _in_flight.get(key) is f else None)
+
+# ===== Запрос к API с повторами =====
+# Вызывать под deepseek_limiter.slot(): при повторах место не отпускается, и
+# это заодно притормаживает остальные запросы, пока API отвечает ошибками.
+# Каждая попытка — платный вызов: токен на первую берёт slot(), на повторы — acquire().
+async def _create_completion(**kwargs):
+    for attempt in range(AI_MAX_RETRIES + 1):
+        if attempt:
+            await deepseek_limiter.acquire()
+        try:
+            return await client.chat.completions.create(**kwargs)
+        except RETRYABLE_ERRORS as e:
+            if attempt == AI_MAX_RETRIES:
+                raise
+            delay = AI_RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning("DeepSeek: %s, повтор через %.1f с", e.__class__.__name__, delay)
+            await asyncio.sleep(delay)
+
+# ===== Лимит пользователя =====
+# Проверяется только перед новым запросом к API: ответы из FAQ, кеша и
+# уже идущего запроса бесплатны и лимит не расходуют.
+def _admit(user_id: int | None):
+    if user_id is None:
+        return
+    rejection = user_limiter.check(user_id)
+    if rejection:
+        raise UserLimitExceeded(rejection)
 
 # ===== Функция запроса к DeepSeek =====
-async def ask_ai_lawyer(question: str, context: str = "") -> str:
-    cached = get_cached_answer(question)
+async def ask_ai_lawyer(question: str, context: str = "", history: list[dict] | None = None,
+                        user_id: int | None = None) -> str:
+    """Ответ на вопрос; history — предыдущие ходы разговора из chat_history.messages().
+
+    С user_id новый запрос к API расходует лимит пользователя; если он
+    исчерпан, поднимается UserLimitExceeded.
+    """
+    local = knowledge_base.answer(question)
+    if local:
+        return local
+
+    # Ответ на уточняющий вопрос зависит от истории, поэтому она входит в ключ
+    scope = history_key(history)
+    cached = await answer_cache.get(question, scope)
     if cached:
         return cached  # возвращаем только текст
 
+    context = context or knowledge_base.context_for(question)
+
+    key = cache_key(question, scope)
+    task = _in_flight.get(key)
+    if task is None:
+        _admit(user_id)
+        task = asyncio.create_task(_ask_deepseek(question, context, history or [], scope))
+        _track_in_flight(key, task)
+    # shield: если один из ждущих отменён, запрос для остальных продолжается
+    return await asyncio.shield(task)
+
+def _build_messages(question: str, context: str, history: list[dict]) -> list[dict]:
     prompt = f"""
 Контекст: {context}
 
 Вопрос клиента: {question}
 """
+    return [
+        {"role": "system", "content": "Ты - опытный юрист по банкротству."},
+        *history,
+        {"role": "user", "content": prompt}
+    ]
 
+async def _ask_deepseek(question: str, context: str, history: list[dict], scope: str) -> str:
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "Ты - опытный юрист по банкротству."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.3
-        )
+        with measure(AI_LATENCY, "complete"):
+            async with deepseek_limiter.slot():
+                response = await _create_completion(
+                    model="deepseek-chat",
+                    messages=_build_messages(question, context, history),
+                    max_tokens=500,
+                    temperature=0.3
+                )
         answer = response.choices[0].message.content.strip()
-        save_cache(question, answer)
+        answer_cache.put(question, answer, scope)
         return answer
     except Exception as e:
-        return f"Ошибка DeepSeek AI: {e}"
-
-# ===== Сохранение истории чата =====
-def save_ai_chat(user_id: int, question: str, answer: str):
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS ai_chat_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            question TEXT,
-            answer TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    cur.execute(
-        "INSERT INTO ai_chat_history (user_id, question, answer) VALUES (?, ?, ?)",
-        (user_id, question, answer)
-    )
-    conn.commit()
-    conn.close()
+        AI_ERRORS.labels("complete").inc()
+        return f"{ERROR_PREFIX}{e}"
+
+# ===== Потоковый ответ =====
+async def stream_ai_lawyer(question: str, context: str = "", history: list[dict] | None = None,
+                           user_id: int | None = None):
+    """Отдаёт ответ кусками по мере генерации.
+
+    Ответ из кеша или из уже идущего запроса с тем же вопросом приходит
+    одним куском. Готовый ответ попадает в кеш, а лимит пользователя
+    проверяется так же, как в ask_ai_lawyer.
+    """
+    local = knowledge_base.answer(question)
+    if local:
+        yield local
+        return
+
+    scope = history_key(history)
+    cached = await answer_cache.get(question, scope)
+    if cached:
+        yield cached
+        return
+
+    context = context or knowledge_base.context_for(question)
+
+    key = cache_key(question, scope)
+    pending = _in_flight.get(key)
+    if pending is not None:
+        yield await asyncio.shield(pending)
+        return
+    _admit(user_id)
+
+    # Поток читает отдельная задача: правки сообщения в Telegram не держат
+    # место в deepseek_limiter и не попадают в замер AI_LATENCY. Остальные
+    # одинаковые вопросы дождутся полного текста этой задачи.
+    chunks: asyncio.Queue[str | None] = asyncio.Queue()
+    task = asyncio.create_task(_stream_deepseek(question, context, history or [], scope, chunks))
+    _track_in_flight(key, task)
+    while (chunk := await chunks.get()) is not None:
+        yield chunk
+
+async def _stream_deepseek(question: str, context: str, history: list[dict], scope: str,
+                           chunks: asyncio.Queue) -> str:
+    """Читает поток DeepSeek в chunks (None — конец) и возвращает полный текст."""
+    started = time.perf_counter()
+    parts = []
+    try:
+        with measure(AI_LATENCY, "stream"):
+            async with deepseek_limiter.slot():
+                stream = await _create_completion(
+                    model="deepseek-chat",
+                    messages=_build_messages(question, context, history),
+                    max_tokens=500,
+                    temperature=0.3,
+                    stream=True
+                )
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if not parts:
+                        AI_TTFT.observe(time.perf_counter() - started)
+                    parts.append(delta)
+                    chunks.put_nowait(delta)
+        answer = "".join(parts).strip()
+        # Пустой поток — не ответ: из кеша он вернулся бы пустым «попаданием»
+        if answer:
+            answer_cache.put(question, answer, scope)
+        return answer
+    except Exception as e:
+        AI_ERRORS.labels("stream").inc()
+        answer = f"{ERROR_PREFIX}{e}"
+        chunks.put_nowait(("\n\n" if parts else "") + answer)
+        return answer
+    finally:
+        chunks.put_nowait(None)
+
+# ===== Анализ заявки для юриста =====
+async def analyze_case_with_ai(user_data: dict) -> str:
+    """Краткий разбор заявки. Временные ошибки повторяет _create_completion, остальные поднимаются."""
+    prompt = f"""
+Долг: {user_data.get('debt_amount') or 'не указан'} руб.
+Среднемесячный доход: {user_data.get('income_amount') or 'не указан'} руб.
+Описание ситуации: {user_data.get('case_description') or 'не указано'}
+
+Оцени перспективы банкротства физического лица, риски и что уточнить у клиента.
+Ответь кратко, по пунктам.
+"""
+    try:
+        with measure(AI_LATENCY, "analysis"):
+            async with deepseek_limiter.slot():
+                response = await _create_completion(
+                    model="deepseek-chat",
+                    messages=[
+                        {"role": "system", "content": "Ты - опытный юрист по банкротству."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=500,
+                    temperature=0.3
+                )
+    except Exception:
+        AI_ERRORS.labels("analysis").inc()
+        raise
+    return response.choices[0].message.content.strip()
@@ -0,0 +1,49 @@
+"""Пропускная способность ask_ai_lawyer при N одновременных пользователях.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_ai_concurrency
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+LATENCY = 0.2
+USERS = (1, 10, 50, 100, 200)
+
+
+async def main():
+    server = await FakeOpenAIServer(latency=LATENCY).start()
+
+    # Настройки читаются при импорте, поэтому окружение готовим заранее,
+    # а базу кеша кладём во временный каталог
+    os.environ["DEEPSEEK_API_KEY"] = "bench"
+    os.environ["DEEPSEEK_BASE_URL"] = server.base_url
+    os.environ.setdefault("AI_RATE_PER_SECOND", "100000")  # меряем клиент, а не лимит квоты
+    os.environ.setdefault("AI_RATE_BURST", "100000")
+    os.environ.setdefault("AI_MAX_CONCURRENCY", "100")
+    os.chdir(tempfile.mkdtemp())
+    from ai_client import ask_ai_lawyer
+    from db import init_db, close_db
+    await init_db()
+
+    print(f"задержка API {LATENCY * 1000:.0f} мс, AI_MAX_CONCURRENCY={os.environ['AI_MAX_CONCURRENCY']}")
+    print(f"{'users':>6} {'time, s':>8} {'req/s':>8}")
+    for users in USERS:
+        start = time.perf_counter()
+        answers = await asyncio.gather(*(
+            ask_ai_lawyer(f"Вопрос {users}-{i}") for i in range(users)
+        ))
+        elapsed = time.perf_counter() - start
+        errors = sum(a.startswith("Ошибка") for a in answers)
+        print(f"{users:>6} {elapsed:>8.2f} {users / elapsed:>8.1f}" + (f"  ошибок: {errors}" if errors else ""))
+
+    await close_db()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
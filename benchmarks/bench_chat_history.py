@@ -0,0 +1,89 @@
+"""Контекст разговора: размер промпта, загрузка истории из базы и память.
+
+В ai_chat_history кладётся ROWS ходов USERS пользователей. Замеряется:
+- рост истории в промпте за длинный разговор — без ограничений и с бюджетом;
+- загрузка истории пользователя по индексу (user_id, created_at) и без него;
+- память на разговор в LRU.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_chat_history
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import db
+from chat_history import ChatHistory, estimate_tokens, history_key
+
+USERS = 10_000
+ROWS = 500_000
+TURNS = 30
+LOOKUPS = 20
+
+QUESTION = "У меня долг {n} тысяч по кредитам и микрозаймам, доход 40 тысяч. Что будет с квартирой?"
+ANSWER = "Единственное жильё при банкротстве не забирают, если оно не в ипотеке. " * 6
+
+
+async def populate():
+    conn = db.get_db()
+    await conn.executemany(db.INSERT_AI_CHAT, (
+        (i % USERS, QUESTION.format(n=i), ANSWER) for i in range(ROWS)
+    ))
+    await conn.commit()
+
+
+async def select_ms(sql: str, limit: int) -> float:
+    samples = []
+    for user_id in range(0, USERS, USERS // LOOKUPS):
+        start = time.perf_counter()
+        async with db.get_db().execute(sql, (user_id, limit)) as cur:
+            await cur.fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main() -> int:
+    os.chdir(tempfile.mkdtemp())
+    await db.init_db()
+    await populate()
+
+    history = ChatHistory()
+    unbounded = 0
+    print(f"размер истории в промпте, токенов (оценка) за {TURNS} ходов:")
+    for turn in range(1, TURNS + 1):
+        messages = await history.messages(-1)
+        question = QUESTION.format(n=turn * 100)
+        history.add(-1, question, ANSWER)
+        unbounded += estimate_tokens(question) + estimate_tokens(ANSWER)
+        if turn in (1, 5, 10, 20, TURNS):
+            bounded = sum(estimate_tokens(m["content"]) for m in messages)
+            print(f"  ход {turn:>2}: без ограничений {unbounded:>6}, с бюджетом {bounded:>5}")
+
+    # Разные истории — разные ключи кеша, одинаковые — один ключ
+    first, second = await history.messages(-1), await history.messages(-2)
+    keys_ok = history_key(first) != history_key(second) and history_key(first) == history_key(await history.messages(-1))
+
+    limit = history.max_turns * 2
+    indexed = await select_ms(db.SELECT_AI_CHAT, limit)
+    full_scan = await select_ms(db.SELECT_AI_CHAT.replace("FROM ai_chat_history", "FROM ai_chat_history NOT INDEXED"), limit)
+    print(f"загрузка истории при {ROWS} строках: по индексу {indexed:.2f} мс, без индекса {full_scan:.2f} мс (медиана)")
+
+    history = ChatHistory()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for user_id in range(1000):
+        await history.messages(user_id)
+    per_user = (tracemalloc.get_traced_memory()[0] - before) / 1000
+    tracemalloc.stop()
+    print(f"память на разговор в LRU: {per_user / 1024:.1f} КиБ ({history.max_turns} ходов и выжимка)")
+
+    await db.close_db()
+    return 0 if keys_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,96 @@
+"""Запись истории чата: старый COMMIT на каждое сообщение против отложенной записи.
+
+Базовый режим — save_ai_chat из кода до общего соединения: синхронный
+sqlite3.connect на каждое сообщение, CREATE TABLE IF NOT EXISTS, INSERT и
+COMMIT в журнале по умолчанию (rollback journal, отдельный файл базы).
+Он выполняется прямо в event loop, как в старом обработчике.
+
+Сообщения приходят с постоянной частотой RATE в секунду, по кругу от USERS
+пользователей. Задержка — от прихода сообщения до ответа пользователю в
+обработчике: сохранение истории и ответ (await), включая время, пока
+event loop занят чужими сохранениями.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_db_writes
+"""
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import db
+
+USERS = 200
+MESSAGES = 20
+RATE = 1000  # сообщений в секунду
+LEGACY_DB = "legacy.db"
+
+
+def legacy_save_ai_chat(user_id: int, question: str, answer: str):
+    # Старый ai_client.save_ai_chat без изменений, кроме имени базы
+    conn = sqlite3.connect(LEGACY_DB)
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ai_chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            question TEXT,
+            answer TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute(
+        "INSERT INTO ai_chat_history (user_id, question, answer) VALUES (?, ?, ?)",
+        (user_id, question, answer)
+    )
+    conn.commit()
+    conn.close()
+
+
+async def handle(save, user_id: int, i: int, arrival: float, latencies: list):
+    await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+    save(user_id, f"Вопрос {i}", "Ответ")
+    await asyncio.sleep(0)  # reply_text
+    latencies.append(time.perf_counter() - arrival)
+
+
+async def run(name: str, save, commits):
+    latencies = []
+    rows = USERS * MESSAGES
+    # Первое сообщение чуть позже: чтобы создание задач не шло в задержку
+    start = time.perf_counter() + 0.1
+    await asyncio.gather(*(
+        handle(save, n % USERS, n // USERS, start + n / RATE, latencies) for n in range(rows)
+    ))
+    await db.get_writer().flush()
+    elapsed = time.perf_counter() - start
+    n_commits = commits()
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"{name:<20} {rows / elapsed:>10.0f} {n_commits:>8} {n_commits / elapsed:>10.0f} "
+          f"{cuts[49] * 1000:>10.2f} {cuts[98] * 1000:>10.2f}")
+
+
+def legacy_commits() -> int:
+    conn = sqlite3.connect(LEGACY_DB)
+    try:
+        return conn.execute("SELECT count(*) FROM ai_chat_history").fetchone()[0]
+    finally:
+        conn.close()
+
+
+async def main():
+    os.chdir(tempfile.mkdtemp())
+    await db.init_db()
+    print(f"{USERS} пользователей x {MESSAGES} сообщений, {RATE} сообщений/с")
+    print(f"{'режим':<20} {'строк/с':>10} {'commits':>8} {'commits/s':>10} {'p50, мс':>10} {'p99, мс':>10}")
+    await run("commit на сообщение", legacy_save_ai_chat, legacy_commits)
+    writer = db.get_writer()
+    before = writer.commits
+    await run("write-behind", db.save_ai_chat, lambda: writer.commits - before)
+    await db.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""База знаний: время построения индекса, задержка поиска и доля ответов без ИИ.
+
+Скрипт падает, если FAQ ответил на вопрос не той статьёй.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_knowledge_base
+"""
+import statistics
+import sys
+import time
+
+from knowledge_base import KnowledgeBase
+
+# Типичные вопросы пользователей и статья, которой FAQ должен ответить.
+# Не ответить (уйти к ИИ) допустимо всегда, ответить не той статьёй — нет.
+# None — вопросы, на которые FAQ отвечать не должен.
+QUESTIONS = [
+    ("Какие документы нужны для банкротства?", 'documents'),
+    ("какие документы нужны для банкротства", 'documents'),
+    ("Какие нужны документы?", 'documents'),
+    ("Документы для банкротства физлица", 'documents'),
+    ("Сколько стоит процедура?", 'cost'),
+    ("сколько стоит банкротство", 'cost'),
+    ("Какие расходы на банкротство?", 'cost'),
+    ("Что будет с моей квартирой?", 'apartment'),
+    ("Заберут ли у меня квартиру?", 'apartment'),
+    ("Отберут единственное жилье?", 'apartment'),
+    ("Что будет с ипотекой?", 'mortgage'),
+    ("Заберут машину?", 'car'),
+    ("Как обанкротиться через МФЦ?", 'mfc'),
+    ("Что такое внесудебное банкротство", 'mfc'),
+    ("Сколько длится банкротство?", 'duration'),
+    ("Какие последствия у банкротства?", 'consequences'),
+    ("Дадут ли кредит после банкротства?", 'consequences'),
+    ("Спишут ли алименты?", 'not_written_off'),
+    ("Какие долги не спишут?", 'not_written_off'),
+    ("Что будет с зарплатой?", 'income'),
+    ("Что будет с мужем при моем банкротстве?", 'spouse'),
+    ("Что такое реструктуризация?", 'restructuring'),
+    ("У меня долг 800 тысяч по трем кредиткам и микрозаймам, доход 40 тысяч, что делать?", None),
+    ("Можно ли продать дачу перед банкротством?", None),
+    ("Я ИП на упрощенке, как банкротиться?", None),
+    ("Коллекторы звонят родственникам, что делать?", None),
+    ("Банк подал в суд, успею ли подать на банкротство?", None),
+    ("Можно ли уехать в отпуск за границу во время процедуры?", None),
+    ("Что будет с наследством, если я его получу во время банкротства?", None),
+    ("Поручитель по кредиту брата, меня тоже обанкротят?", None),
+    # Отрицание меняет смысл вопроса статьи — отвечает ИИ
+    ("Какие документы не нужны для банкротства?", None),
+    ("Что не будет с моей квартирой?", None),
+]
+REPEATS = 200
+
+
+def main():
+    kb = KnowledgeBase()
+    start = time.perf_counter()
+    kb.load()
+    build = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(REPEATS):
+        for question, _ in QUESTIONS:
+            start = time.perf_counter()
+            if kb.answer(question) is None:
+                kb.context_for(question)
+            latencies.append(time.perf_counter() - start)
+
+    matched = {question: kb.match(question) for question, _ in QUESTIONS}
+    local = [question for question, entry in matched.items() if entry is not None]
+    wrong = [question for question, expected in QUESTIONS
+             if matched[question] is not None and matched[question]["id"] != expected]
+    print(f"построение индекса: {build * 1000:.2f} мс ({len(kb.entries)} статей)")
+    print(f"поиск: p50 {statistics.median(latencies) * 1e6:.0f} мкс, "
+          f"p99 {statistics.quantiles(latencies, n=100)[98] * 1e6:.0f} мкс")
+    print(f"отвечено без ИИ: {len(local)} из {len(QUESTIONS)} ({len(local) / len(QUESTIONS):.0%}), "
+          f"не той статьёй: {len(wrong)}")
+    for question, expected in QUESTIONS:
+        entry = matched[question]
+        if entry is None:
+            mark = "ИИ "
+        elif question in wrong:
+            mark = f"ОШИБКА {entry['id']} вместо {expected}:"
+        else:
+            mark = f"FAQ {entry['id']}:"
+        print(f"  {mark}  {question}")
+    return 1 if wrong else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Накладные расходы метрик и трассировок.
+
+Сравнивает пустой обработчик с тем же обработчиком в instrument_handler
+(без трассировки и с трассировкой каждого апдейта), замеряет observe()
+и measure(), а затем отдаёт /metrics по HTTP, как это делает Prometheus.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_metrics
+"""
+import asyncio
+import logging
+import sys
+import time
+
+import metrics
+from metrics import AI_LATENCY, DB_LATENCY, instrument_handler, measure
+
+CALLS = 200_000
+
+
+async def noop(update, context):
+    return None
+
+
+async def handler_cost(callback) -> float:
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        await callback(None, None)
+    return (time.perf_counter() - start) / CALLS
+
+
+def sync_cost(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        fn()
+    return (time.perf_counter() - start) / CALLS
+
+
+def measured():
+    with measure(DB_LATENCY, "bench"):
+        pass
+
+
+async def scrape(port: int) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+async def main() -> int:
+    logging.disable(logging.INFO)  # трассировки пишутся в лог, печать не меряем
+    bare = await handler_cost(noop)
+    wrapped = await handler_cost(instrument_handler("bench", noop))
+    metrics.TRACE_SAMPLE_RATE = 1.0
+    traced = await handler_cost(instrument_handler("bench_traced", noop))
+    metrics.TRACE_SAMPLE_RATE = 0.0
+
+    histogram = AI_LATENCY.labels("bench")
+    print(f"пустой обработчик:         {bare * 1e9:>7.0f} нс")
+    print(f"+ instrument_handler:      {(wrapped - bare) * 1e9:>7.0f} нс")
+    print(f"+ трассировка каждого:     {(traced - bare) * 1e9:>7.0f} нс")
+    print(f"Histogram.observe():       {sync_cost(lambda: histogram.observe(0.1)) * 1e9:>7.0f} нс")
+    print(f"measure():                 {sync_cost(measured) * 1e9:>7.0f} нс")
+
+    # Порт 0 в start_metrics_server выключает эндпоинт, поэтому свободный порт берём сами
+    server = await asyncio.start_server(metrics._serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    start = time.perf_counter()
+    response = await scrape(port)
+    print(f"GET /metrics: {len(response)} байт за {(time.perf_counter() - start) * 1000:.2f} мс")
+    server.close()
+    await server.wait_closed()
+    return 0 if response.startswith(b"HTTP/1.1 200") and b"bot_handler_seconds_count" in response else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,82 @@
+"""Стоимость сохранения состояния при 100k сохранённых диалогов.
+
+В bot_state заранее кладутся user_data и состояния диалога для STORED
+пользователей. Затем замеряются загрузка при старте и один цикл
+update_persistence, как его делает PTB: апдейты затронули TOUCHED
+пользователей, из них у части данные действительно изменились.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_persistence
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import db
+from persistence import BotPersistence, SqliteBackend, USER_DATA, _conversation_kind
+
+STORED = 100_000
+TOUCHED = 10_000
+CONVERSATION = "conversation_handler"
+
+
+def user_data(user_id: int, step: int = 0) -> dict:
+    return {"debt_amount": 750000.0 + step, "full_name": f"Пользователь {user_id}", "phone": "+79990000000"}
+
+
+async def populate():
+    conn = db.get_db()
+    await conn.executemany(SqliteBackend.UPSERT, (
+        (USER_DATA, str(i), json.dumps(user_data(i), ensure_ascii=False)) for i in range(STORED)
+    ))
+    await conn.executemany(SqliteBackend.UPSERT, (
+        (_conversation_kind(CONVERSATION), json.dumps([i, i]), "0") for i in range(STORED)
+    ))
+    await conn.commit()
+
+
+async def persistence_run(persistence: BotPersistence, changed: int) -> tuple[float, float]:
+    """(время вызовов update_*, время записи в базу)."""
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        persistence.update_user_data(i, user_data(i, step=1 if i < changed else 0))
+        for i in range(TOUCHED)
+    ), *(
+        persistence.update_conversation(CONVERSATION, (i, i), 2 if i < changed else 0)
+        for i in range(TOUCHED)
+    ))
+    marked = time.perf_counter()
+    await persistence.flush()
+    return marked - start, time.perf_counter() - marked
+
+
+async def main():
+    os.chdir(tempfile.mkdtemp())
+    await db.init_db()
+    await populate()
+
+    persistence = BotPersistence(SqliteBackend())
+    start = time.perf_counter()
+    users = await persistence.get_user_data()
+    conversations = await persistence.get_conversations(CONVERSATION)
+    print(f"загрузка {len(users)} user_data и {len(conversations)} диалогов: {time.perf_counter() - start:.2f} с")
+
+    print(f"затронуто {TOUCHED} пользователей за интервал:")
+    for changed in (0, 100, 1_000, TOUCHED):
+        marking, writing = await persistence_run(persistence, changed)
+        print(f"  изменилось {changed:>6}: сравнение {marking * 1000:>7.1f} мс, запись {writing * 1000:>7.1f} мс")
+        # Возвращаем исходные данные, чтобы следующий прогон снова что-то менял
+        await persistence_run(persistence, 0)
+
+    start = time.perf_counter()
+    await SqliteBackend().save({
+        (USER_DATA, str(i)): json.dumps(user_data(i, step=2), ensure_ascii=False) for i in range(STORED)
+    })
+    print(f"для сравнения, запись всех {STORED}: {(time.perf_counter() - start) * 1000:.1f} мс")
+    await db.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
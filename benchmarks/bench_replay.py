@@ -0,0 +1,251 @@
+"""Нагрузочный прогон всего бота без Telegram и DeepSeek.
+
+Настоящее приложение из main.build_application() (ConversationHandler,
+persistence, очередь заявок, кеш, лимиты) получает синтетические апдейты
+от USERS пользователей. Bot API подменяет FakeTelegramRequest, DeepSeek —
+локальный FakeOpenAIServer с задержкой --latency.
+
+Каждый пользователь проходит --flows сценариев из трёх:
+- calculator: /start, «Калькулятор долга», сумма долга, доход;
+- contact: /start, «Связаться с юристом», ФИО, телефон, описание ситуации;
+- ai: /start, «Вопрос ИИ-юристу», вопрос и уточняющий вопрос.
+Следующее сообщение пользователь шлёт, когда бот обработал предыдущее
+(через --think секунд), а апдейты идут через update_processor приложения,
+то есть с тем же ограничением CONCURRENT_UPDATES, что и в боевом режиме.
+
+Затем ещё --memory-users новых пользователей проходят по сценарию под
+tracemalloc: прирост памяти после прогона, делённый на их число, — это
+состояние, которое бот держит на одного активного пользователя.
+
+Результат печатается одним JSON, чтобы сравнивать прогоны между коммитами:
+    python -m benchmarks.bench_replay > before.json
+    python -m benchmarks.bench_replay --latency 0.5 --stream 0 --output after.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_telegram import FakeTelegramRequest, make_update
+
+LAWYER_CHAT_ID = 1000
+FIRST_USER_ID = 10_000
+
+AI_QUESTIONS = (
+    "Какие документы нужны для банкротства?",
+    "Что будет с моей квартирой?",
+    "Сколько стоит процедура?",
+    "У меня долг {debt} тысяч по кредиткам и микрозаймам, доход {income} тысяч, что делать?",
+    "Можно ли продать машину за {months} месяцев до банкротства?",
+)
+FOLLOW_UPS = (
+    "А если квартира в ипотеке?",
+    "А сколько это займёт по времени?",
+    "А что будет с поручителем?",
+)
+
+
+def flow_calculator(rng: random.Random) -> list[str]:
+    return ["/start", "💰 Калькулятор долга", f"{rng.randint(100, 5000)} 000", str(rng.randint(15, 200) * 1000)]
+
+
+def flow_contact(rng: random.Random) -> list[str]:
+    return [
+        "/start", "📞 Связаться с юристом", "Иванов Иван Иванович", f"+7999{rng.randint(0, 9999999):07d}",
+        f"Долг {rng.randint(300, 3000)} тысяч по трём кредитам, просрочка полгода, звонят коллекторы.",
+    ]
+
+
+def flow_ai(rng: random.Random) -> list[str]:
+    question = rng.choice(AI_QUESTIONS).format(
+        debt=rng.randint(300, 3000), income=rng.randint(20, 120), months=rng.randint(1, 36),
+    )
+    return ["/start", "🤖 Вопрос ИИ-юристу", question, rng.choice(FOLLOW_UPS)]
+
+
+FLOWS = {"calculator": flow_calculator, "contact": flow_contact, "ai": flow_ai}
+
+
+def percentiles(samples: list[float]) -> dict:
+    if len(samples) < 2:
+        return {}
+    cuts = statistics.quantiles(samples, n=100)
+    return {
+        "p50": round(cuts[49] * 1000, 2),
+        "p90": round(cuts[89] * 1000, 2),
+        "p99": round(cuts[98] * 1000, 2),
+        "max": round(max(samples) * 1000, 2),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Replay:
+    def __init__(self, application, rng: random.Random, think: float):
+        from telegram import Update
+        self.application = application
+        self.update_class = Update
+        self.rng = rng
+        self.think = think
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.updates = 0
+
+    async def send(self, user_id: int, text: str) -> float:
+        update = self.update_class.de_json(make_update(user_id, text), self.application.bot)
+        start = time.perf_counter()
+        await self.application.update_processor.process_update(update, self.application.process_update(update))
+        self.updates += 1
+        return time.perf_counter() - start
+
+    async def user(self, user_id: int, flows: list[str]):
+        for name in flows:
+            for text in FLOWS[name](self.rng):
+                self.latencies[name].append(await self.send(user_id, text))
+                if self.think:
+                    await asyncio.sleep(self.think)
+
+    async def run(self, user_ids: range, flows_per_user: int) -> list[str]:
+        plans = [[self.rng.choice(list(FLOWS)) for _ in range(flows_per_user)] for _ in user_ids]
+        await asyncio.gather(*(self.user(user_id, plan) for user_id, plan in zip(user_ids, plans)))
+        return [name for plan in plans for name in plan]
+
+
+async def main(args) -> dict:
+    server = await FakeOpenAIServer(latency=args.latency, chunk_delay=args.chunk_delay,
+                                    answer=" ".join(["Тестовый ответ юриста."] * 8)).start()
+    os.environ["DEEPSEEK_API_KEY"] = "bench"
+    os.environ["DEEPSEEK_BASE_URL"] = server.base_url
+    os.environ["LAWYER_CHAT_ID"] = str(LAWYER_CHAT_ID)
+    os.environ["AI_STREAMING"] = "1" if args.stream else "0"
+    os.environ.setdefault("METRICS_PORT", "0")
+    # Меряем бота, а не квоты: лимиты DeepSeek и пользователей не должны отказывать
+    os.environ.setdefault("AI_RATE_PER_SECOND", "100000")
+    os.environ.setdefault("AI_RATE_BURST", "100000")
+    os.environ.setdefault("USER_RATE_BURST", "1000")
+    commit = git_commit()
+    os.chdir(tempfile.mkdtemp())
+
+    from telegram.ext import Application
+    from main import build_application
+    from config import AI_STREAMING, CONCURRENT_UPDATES
+    logging.getLogger().setLevel(logging.WARNING)
+
+    leads_notified = 0
+    leads_done = asyncio.Event()
+    expected_leads = None
+
+    def on_call(method: str, params: dict):
+        nonlocal leads_notified
+        if method == "sendMessage" and int(params["chat_id"]) == LAWYER_CHAT_ID:
+            leads_notified += 1
+            if expected_leads is not None and leads_notified >= expected_leads:
+                leads_done.set()
+
+    request = FakeTelegramRequest(on_call=on_call)
+    application = build_application(
+        Application.builder().token("1:bench").request(request).updater(None)
+    )
+    rng = random.Random(args.seed)
+
+    async with application:
+        await application.post_init(application)
+        await application.start()
+
+        replay = Replay(application, rng, args.think)
+        start = time.perf_counter()
+        flows = await replay.run(range(FIRST_USER_ID, FIRST_USER_ID + args.users), args.flows)
+        duration = time.perf_counter() - start
+        updates = replay.updates
+        ai_requests = server.requests
+
+        # Заявки уходят юристу в фоне — ждём, пока очередь разберётся
+        expected_leads = flows.count("contact")
+        if leads_notified < expected_leads:
+            try:
+                await asyncio.wait_for(leads_done.wait(), timeout=60)
+            except asyncio.TimeoutError:
+                pass
+        leads_drained = time.perf_counter() - start
+        notified = leads_notified
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        memory_users = range(FIRST_USER_ID + args.users, FIRST_USER_ID + args.users + args.memory_users)
+        await Replay(application, rng, 0).run(memory_users, args.flows)
+        gc.collect()
+        per_user = (tracemalloc.get_traced_memory()[0] - before) / max(args.memory_users, 1)
+        tracemalloc.stop()
+
+        await application.stop()
+        await application.post_stop(application)
+    await application.post_shutdown(application)
+    await server.stop()
+
+    all_latencies = [value for values in replay.latencies.values() for value in values]
+    return {
+        "commit": commit,
+        "params": {
+            "users": args.users, "flows_per_user": args.flows, "latency": args.latency,
+            "chunk_delay": args.chunk_delay, "stream": bool(AI_STREAMING), "think": args.think,
+            "seed": args.seed, "concurrent_updates": CONCURRENT_UPDATES,
+        },
+        "updates": updates,
+        "duration_s": round(duration, 3),
+        "throughput_ups": round(updates / duration, 1),
+        "latency_ms": percentiles(all_latencies),
+        "flows": {
+            name: {"runs": flows.count(name), "updates": len(samples), "latency_ms": percentiles(samples)}
+            for name, samples in sorted(replay.latencies.items())
+        },
+        "ai_requests": ai_requests,
+        "leads": {"submitted": expected_leads, "notified": notified, "drained_s": round(leads_drained, 3)},
+        "telegram_calls": dict(request.calls),
+        "memory_per_user_kib": round(per_user / 1024, 2),
+        "max_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=300, help="пользователей в основном прогоне")
+    parser.add_argument("--flows", type=int, default=2, help="сценариев на пользователя")
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка фейкового DeepSeek, сек")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="пауза между чанками потока, сек")
+    parser.add_argument("--stream", type=int, choices=(0, 1), default=1, help="потоковые ответы ИИ")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза пользователя между сообщениями, сек")
+    parser.add_argument("--memory-users", type=int, default=200, help="пользователей в замере памяти")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="куда дополнительно записать JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(main(args))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    sys.exit(0 if result["leads"]["notified"] >= result["leads"]["submitted"] else 1)
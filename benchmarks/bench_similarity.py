@@ -0,0 +1,67 @@
+"""Поиск похожего вопроса в кеше при CACHE_MAX_ENTRIES записей.
+
+Индекс заполняется синтетическими вопросами о банкротстве (почти все с
+общим словом «банкротство»), затем замеряется поиск для промахов и для
+перефразированных вопросов. Скрипт падает, если перефразировка не нашлась.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_similarity
+"""
+import random
+import statistics
+import sys
+import time
+
+from ai_cache import SimilarityIndex
+from config import CACHE_MAX_ENTRIES, CACHE_SIMILARITY_THRESHOLD
+from text_utils import normalize_text
+
+SEARCHES = 500
+
+SUBJECTS = ("квартира", "машина", "дача", "зарплата", "ипотека", "кредитка", "микрозайм", "алименты",
+            "поручитель", "супруг", "наследство", "гараж", "вклад", "пенсия", "бизнес", "налоги")
+TEMPLATES = (
+    "что будет с {a} и {b} при банкротстве если долг {n} тысяч",
+    "заберут ли {a} при банкротстве если есть {b} и долг {n}",
+    "как сохранить {a} и {b} при банкротстве с долгом {n} тысяч",
+)
+
+
+def question(rng: random.Random) -> str:
+    a, b = rng.sample(SUBJECTS, 2)
+    return rng.choice(TEMPLATES).format(a=a, b=b, n=rng.randint(100, 9999))
+
+
+def main() -> int:
+    rng = random.Random(1)
+    index = SimilarityIndex()
+    keys = [normalize_text(question(rng)) for _ in range(CACHE_MAX_ENTRIES)]
+    for key in keys:
+        index.add(key)
+
+    def timed(texts):
+        samples, found = [], []
+        for text in texts:
+            start = time.perf_counter()
+            found.append(index.search(text))
+            samples.append(time.perf_counter() - start)
+        return samples, found
+
+    misses, _ = timed(normalize_text(question(rng)) for _ in range(SEARCHES))
+    originals = rng.sample(keys, SEARCHES)
+    # Перефразировка: тот же вопрос с другим порядком слов и знаками препинания
+    hits, found = timed(" ".join(reversed(key.split())) + "?" for key in originals)
+    # Индекс не видит порядка слов: вопрос с теми же словами в другом порядке тоже верный ответ
+    recalled = sum(key is not None and sorted(key.split()) == sorted(original.split())
+                   and score >= CACHE_SIMILARITY_THRESHOLD
+                   for (key, score), original in zip(found, originals))
+
+    for name, samples in (("промах", misses), ("перефразировка", hits)):
+        print(f"{name:>15}: p50 {statistics.median(samples) * 1000:.2f} мс, "
+              f"p99 {statistics.quantiles(samples, n=100)[98] * 1000:.2f} мс")
+    print(f"{len(index)} записей, найдено перефразировок: {recalled} из {SEARCHES}")
+    return 0 if recalled == SEARCHES else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
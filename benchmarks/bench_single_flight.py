@@ -0,0 +1,54 @@
+"""Одинаковые вопросы, заданные одновременно, дают один запрос к API.
+
+500 пользователей одновременно задают один и тот же вопрос (с разным
+регистром и пунктуацией). Скрипт падает, если фейковый DeepSeek получил
+больше одного запроса.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_single_flight
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+USERS = 500
+QUESTIONS = (
+    "Какие документы нужны для банкротства?",
+    "какие документы нужны для банкротства",
+    "Какие  документы нужны для банкротства?!",
+)
+
+
+async def main() -> int:
+    server = await FakeOpenAIServer(latency=0.3).start()
+    os.environ["DEEPSEEK_API_KEY"] = "bench"
+    os.environ["DEEPSEEK_BASE_URL"] = server.base_url
+    os.environ.setdefault("AI_RATE_PER_SECOND", "100000")  # меряем клиент, а не лимит квоты
+    os.environ.setdefault("AI_RATE_BURST", "100000")
+    os.chdir(tempfile.mkdtemp())
+    from ai_client import ask_ai_lawyer
+    from db import init_db, close_db
+    await init_db()
+
+    start = time.perf_counter()
+    answers = await asyncio.gather(*(
+        ask_ai_lawyer(QUESTIONS[i % len(QUESTIONS)]) for i in range(USERS)
+    ))
+    elapsed = time.perf_counter() - start
+
+    await close_db()
+    await server.stop()
+
+    print(f"{USERS} одинаковых вопросов за {elapsed:.2f} с, запросов к API: {server.requests}")
+    if server.requests != 1 or len(set(answers)) != 1:
+        print("ОШИБКА: ожидался ровно один запрос к API и один общий ответ")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,117 @@
+"""Пропускная способность webhook-режима на синтетических апдейтах.
+
+Поднимает ASGI-приложение из webhook.py на локальном порту, отправляет
+в него UPDATES апдейтов /start от разных пользователей по CLIENTS соединениям
+и считает, сколько апдейтов в секунду принято по HTTP и сколько полностью
+обработано (бот ответил).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_webhook
+"""
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.fake_telegram import FakeTelegramRequest, make_update
+
+UPDATES = 2000
+CLIENTS = 50
+SECRET = "bench-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def post_updates(port: int, updates: list):
+    """Шлёт апдейты по одному keep-alive соединению.
+
+    Сырой HTTP вместо httpx: клиент работает в том же процессе и не должен
+    съедать процессор, который мы измеряем.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for update in updates:
+        body = json.dumps(update).encode()
+        writer.write(
+            b"POST /telegram HTTP/1.1\r\nHost: localhost\r\n"
+            b"Content-Type: application/json\r\n"
+            b"X-Telegram-Bot-Api-Secret-Token: " + SECRET.encode() + b"\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+        )
+        status = await reader.readline()
+        if b" 200 " not in status:
+            raise RuntimeError(f"webhook ответил {status!r}")
+        length = 0
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+    writer.close()
+
+
+async def main() -> int:
+    os.environ.setdefault("DEEPSEEK_API_KEY", "bench")
+    os.environ.setdefault("METRICS_PORT", "0")
+    os.chdir(tempfile.mkdtemp())
+    from telegram.ext import Application
+    from main import build_application
+    from webhook import create_app
+
+    replies = asyncio.Queue()
+    request = FakeTelegramRequest(
+        on_call=lambda method, params: replies.put_nowait(method) if method == "sendMessage" else None
+    )
+    application = build_application(
+        Application.builder().token("1:bench").request(request).updater(None)
+    )
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(application, secret=SECRET), host="127.0.0.1", port=port, log_level="warning",
+    ))
+
+    async with application:
+        await application.post_init(application)
+        await application.start()
+        serve = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        url = f"http://127.0.0.1:{port}"
+        async with httpx.AsyncClient(base_url=url) as client:
+            health = await client.get("/health")
+            forbidden = await client.post("/telegram", json=make_update(1, "/start"))
+            print(f"/health: {health.status_code} {health.json()}, без секрета: {forbidden.status_code}")
+
+        updates = [make_update(100 + i, "/start") for i in range(UPDATES)]
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            post_updates(port, updates[i::CLIENTS]) for i in range(CLIENTS)
+        ))
+        accepted = time.perf_counter() - start
+        for _ in range(UPDATES):
+            await replies.get()
+        processed = time.perf_counter() - start
+
+        server.should_exit = True
+        await serve
+        await application.stop()
+        await application.post_stop(application)
+    await application.post_shutdown(application)
+
+    print(f"{UPDATES} апдейтов, {CLIENTS} параллельных соединений")
+    print(f"принято:    {UPDATES / accepted:>8.0f} апдейтов/с")
+    print(f"обработано: {UPDATES / processed:>8.0f} апдейтов/с")
+    return 0 if health.status_code == 200 and forbidden.status_code == 403 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,114 @@
+"""Локальный фейковый OpenAI-совместимый сервер для бенчмарков.
+
+Отвечает на POST /chat/completions с заданной задержкой, ничего не знает
+о моделях и считает количество запросов.
+"""
+import asyncio
+import json
+import time
+
+
+class FakeOpenAIServer:
+    def __init__(self, latency: float = 0.2, answer: str = "Тестовый ответ юриста.",
+                 chunk_delay: float = 0.02):
+        self.latency = latency  # время до ответа (для stream=True — до первого чанка)
+        self.chunk_delay = chunk_delay  # пауза между чанками при stream=True
+        self.answer = answer
+        self.requests = 0
+        self._server = None
+        self._writers = set()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        for writer in self._writers:
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                await self._respond(writer, json.loads(body or b"{}"))
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, payload: dict):
+        await asyncio.sleep(self.latency)
+        if payload.get("stream"):
+            await self._respond_stream(writer, payload)
+            return
+        body = json.dumps({
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "deepseek-chat"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+        }, ensure_ascii=False).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+            b"\r\n" + body
+        )
+        await writer.drain()
+
+    async def _respond_stream(self, writer: asyncio.StreamWriter, payload: dict):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"\r\n"
+        )
+        words = self.answer.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            chunk = {
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "deepseek-chat"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": "stop" if i == len(words) - 1 else None,
+                }],
+            }
+            self._write_chunk(writer, b"data: " + json.dumps(chunk, ensure_ascii=False).encode() + b"\n\n")
+            await writer.drain()
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        self._write_chunk(writer, b"")
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
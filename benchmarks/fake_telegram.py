@@ -0,0 +1,70 @@
+"""Фейковый Bot API и генератор синтетических апдейтов для бенчмарков.
+
+FakeTelegramRequest подставляется в Application.builder().request(...) и
+отвечает на методы Bot API из памяти, не обращаясь к сети.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class FakeTelegramRequest(BaseRequest):
+    def __init__(self, on_call=None):
+        self.calls = Counter()
+        self.on_call = on_call  # on_call(method, params) — вызывается на каждый метод
+        self._message_ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: RequestData | None = None,
+                         *args, **kwargs) -> tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[api_method] += 1
+        if self.on_call is not None:
+            self.on_call(api_method, params)
+        return 200, json.dumps({"ok": True, "result": await self._result(api_method, params)}).encode()
+
+    async def _result(self, api_method: str, params: dict):
+        if api_method == "getMe":
+            return BOT_USER
+        if api_method == "getUpdates":
+            await asyncio.sleep(1)
+            return []
+        if api_method in ("sendMessage", "editMessageText"):
+            return {
+                "message_id": params.get("message_id") or next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }
+        return True
+
+
+_update_ids = itertools.count(1)
+
+
+def make_update(user_id: int, text: str) -> dict:
+    """JSON входящего текстового сообщения от пользователя user_id."""
+    update_id = next(_update_ids)
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import re
+from collections import OrderedDict, deque
+
+import db
+from config import HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_MAX_USERS
+
+SUMMARY_WORDS = 25  # сколько слов вопроса остаётся в выжимке старого хода
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    # Для русского текста у DeepSeek выходит примерно токен на 3 символа;
+    # точный токенизатор ради бюджета промпта не нужен
+    return len(text) // 3 + 1
+
+
+def _extract(question: str) -> str:
+    """Выжимка старого хода: первое предложение вопроса, не длиннее SUMMARY_WORDS слов.
+
+    Ответы ИИ в выжимку не попадают: факты о деле сообщает клиент, а ответ
+    при необходимости модель сформулирует заново.
+    """
+    sentence = _SENTENCE_END.split(question.strip(), maxsplit=1)[0]
+    words = sentence.split()
+    return " ".join(words[:SUMMARY_WORDS]) + (" …" if len(words) > SUMMARY_WORDS else "")
+
+
+def history_key(messages: list[dict]) -> str:
+    """Короткий отпечаток истории для ключей кеша; пустая история — пустая строка."""
+    if not messages:
+        return ""
+    raw = json.dumps(messages, ensure_ascii=False, sort_keys=True).encode()
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+class _Dialog:
+    __slots__ = ("turns", "summary")
+
+    def __init__(self, max_turns: int):
+        self.turns: deque[tuple[str, str]] = deque(maxlen=max_turns)  # (вопрос, ответ)
+        self.summary: deque[str] = deque()  # выжимки ходов, вытесненных из turns
+
+
+class ChatHistory:
+    """Скользящий контекст разговора с ИИ-юристом.
+
+    На пользователя в памяти лежат последние max_turns ходов целиком и
+    выжимки более старых. Разговоры хранятся в LRU на max_users
+    пользователей; вытесненный разговор восстанавливается из ai_chat_history
+    одним запросом по индексу (user_id, created_at).
+    """
+
+    def __init__(self, max_turns: int = HISTORY_MAX_TURNS, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 max_users: int = HISTORY_MAX_USERS):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.max_users = max_users
+        self._dialogs: OrderedDict[int, _Dialog] = OrderedDict()
+        self.loaded = 0
+        self.compacted = 0
+
+    async def messages(self, user_id: int) -> list[dict]:
+        """История для промпта: выжимка старых ходов и свежие ходы в пределах token_budget."""
+        if not self.max_turns:
+            return []
+        dialog = await self._dialog(user_id)
+        budget = self.token_budget
+        recent = []
+        older = list(dialog.summary)
+        turns = list(dialog.turns)
+        while turns:
+            question, answer = turns[-1]
+            cost = estimate_tokens(question) + estimate_tokens(answer)
+            if cost > budget:
+                break
+            budget -= cost
+            recent.append(turns.pop())
+        # Ходы, не влезшие в бюджет целиком, идут в выжимку
+        older.extend(_extract(question) for question, _ in turns)
+        while older and estimate_tokens("; ".join(older)) > budget:
+            older.pop(0)
+
+        messages = []
+        if older:
+            messages.append({"role": "system", "content": "Ранее клиент спрашивал: " + "; ".join(older)})
+        for question, answer in reversed(recent):
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+    def add(self, user_id: int, question: str, answer: str):
+        db.save_ai_chat(user_id, question, answer)
+        dialog = self._dialogs.get(user_id)
+        # Разговора нет в памяти — ход подтянется из базы при следующем вопросе
+        if dialog is not None:
+            self._append(dialog, question, answer)
+
+    def stats(self) -> dict:
+        return {"users": len(self._dialogs), "loaded": self.loaded, "compacted": self.compacted}
+
+    async def _dialog(self, user_id: int) -> _Dialog:
+        dialog = self._dialogs.get(user_id)
+        if dialog is not None:
+            self._dialogs.move_to_end(user_id)
+            return dialog
+
+        # Из базы берём и ходы для выжимки, чтобы после вытеснения контекст был тем же
+        rows = await db.load_ai_chat(user_id, self.max_turns * 2)
+        dialog = self._dialogs.get(user_id)  # мог загрузиться, пока ждали базу
+        if dialog is None:
+            dialog = _Dialog(self.max_turns)
+            for question, answer in rows:
+                self._append(dialog, question, answer)
+            self._dialogs[user_id] = dialog
+            self.loaded += 1
+            while len(self._dialogs) > self.max_users:
+                self._dialogs.popitem(last=False)
+        return dialog
+
+    def _append(self, dialog: _Dialog, question: str, answer: str):
+        if len(dialog.turns) == dialog.turns.maxlen:
+            old_question, _ = dialog.turns[0]
+            dialog.summary.append(_extract(old_question))
+            self.compacted += 1
+            # Выжимка занимает не больше четверти бюджета
+            while estimate_tokens("; ".join(dialog.summary)) > self.token_budget // 4:
+                dialog.summary.popleft()
+        dialog.turns.append((question, answer))
+
+
+chat_history = ChatHistory()
@@ -8,3 +8,67 @@ LAWYER_CHAT_ID = os.getenv("LAWYER_CHAT_ID")
 # Для DeepSeek/OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")  # ключ DeepSeek
 DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+
+# Параллельные запросы к DeepSeek
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "20"))  # одновременных запросов к API
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "60"))  # таймаут одного запроса, сек
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "3"))
+AI_RETRY_BACKOFF = float(os.getenv("AI_RETRY_BACKOFF", "1.0"))  # базовая пауза между повторами, сек
+
+# Сколько апдейтов Telegram обрабатывается одновременно
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+
+# Отложенная запись в SQLite: строки копятся в буфере и пишутся одной транзакцией
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "100"))  # сбросить, когда накопилось столько строк
+DB_WRITE_FLUSH_MS = int(os.getenv("DB_WRITE_FLUSH_MS", "200"))  # или не реже, чем раз в столько мс
+
+# Кеш ответов ИИ
+CACHE_LRU_SIZE = int(os.getenv("CACHE_LRU_SIZE", "1000"))  # ответов в памяти процесса
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))  # записей в SQLite
+CACHE_TTL_HOURS = float(os.getenv("CACHE_TTL_HOURS", "720"))  # срок жизни ответа
+# Порог косинусной близости для похожих вопросов (0 — искать только точные совпадения)
+CACHE_SIMILARITY_THRESHOLD = float(os.getenv("CACHE_SIMILARITY_THRESHOLD", "0.85"))
+
+# Потоковые ответы ИИ: сообщение дописывается по мере генерации
+AI_STREAMING = os.getenv("AI_STREAMING", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # не чаще одной правки в столько секунд
+
+# Режим работы: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # публичный https-адрес бота, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # обязателен в режиме webhook, проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+# Хранение состояния диалогов и user_data между перезапусками
+PERSISTENCE_BACKEND = os.getenv("PERSISTENCE_BACKEND", "sqlite")  # sqlite; другое значение — не сохранять. Только один процесс бота
+PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", "5"))  # как часто сбрасывать изменения, сек
+
+# Обработка заявок: ИИ-анализ и уведомление юриста в фоне
+LEAD_WORKERS = int(os.getenv("LEAD_WORKERS", "2"))
+LEAD_MAX_ATTEMPTS = int(os.getenv("LEAD_MAX_ATTEMPTS", "5"))  # попыток уведомить юриста; ИИ-анализ повторяет AI_MAX_RETRIES
+LEAD_RETRY_DELAY = float(os.getenv("LEAD_RETRY_DELAY", "2.0"))  # базовая пауза между попытками, сек
+
+# Ограничение запросов к DeepSeek
+AI_RATE_PER_SECOND = float(os.getenv("AI_RATE_PER_SECOND", "5"))  # общий лимит под квоту DeepSeek; 0 — без лимита
+AI_RATE_BURST = int(os.getenv("AI_RATE_BURST", "20"))
+AI_QUEUE_TIMEOUT = float(os.getenv("AI_QUEUE_TIMEOUT", "30"))  # сколько запрос может ждать в очереди, сек
+USER_RATE_PER_MINUTE = float(os.getenv("USER_RATE_PER_MINUTE", "6"))  # вопросов ИИ от одного пользователя; 0 — без лимита
+USER_RATE_BURST = int(os.getenv("USER_RATE_BURST", "3"))
+USER_DAILY_QUOTA = int(os.getenv("USER_DAILY_QUOTA", "50"))  # 0 — без дневного лимита
+
+# База знаний: частые вопросы отвечаются без запроса к ИИ
+KB_PATH = os.getenv("KB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "faq.json"))
+KB_ANSWER_THRESHOLD = float(os.getenv("KB_ANSWER_THRESHOLD", "0.75"))  # доля вопроса, покрытая FAQ, для ответа без ИИ
+KB_CONTEXT_PASSAGES = int(os.getenv("KB_CONTEXT_PASSAGES", "2"))  # сколько статей FAQ передавать ИИ в контексте
+
+# Метрики Prometheus и трассировки
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 — не поднимать /metrics; 9100 занят node_exporter
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))  # доля апдейтов, которые пишутся в лог трассировкой
+
+# Контекст разговора с ИИ-юристом
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "6"))  # последние пары вопрос-ответ, которые идут в промпт целиком
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))  # примерный предел токенов истории в промпте
+HISTORY_MAX_USERS = int(os.getenv("HISTORY_MAX_USERS", "10000"))  # сколько разговоров держать в памяти
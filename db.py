@@ -1,48 +1,291 @@
-import sqlite3
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import aiosqlite
+from config import DB_WRITE_BATCH_SIZE, DB_WRITE_FLUSH_MS
+from metrics import measure, DB_LATENCY, DB_ROWS_WRITTEN
 
 DB_NAME = "bankruptcy_bot.db"
 
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
-
-    # Таблица для заявок
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            username TEXT,
-            full_name TEXT,
-            phone TEXT,
-            debt_amount REAL,
-            income_amount REAL,
-            case_description TEXT,
-            ai_analysis TEXT,
-            status TEXT DEFAULT 'new',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Таблица для истории AI-чата
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS ai_chat_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            question TEXT,
-            answer TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # ===== Новая таблица кеша =====
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS ai_cache (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question TEXT UNIQUE,
-            answer TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
+logger = logging.getLogger(__name__)
+
+# Одно долгоживущее соединение на весь процесс: открывается в init_db(),
+# закрывается в close_db(). Все обработчики работают через него.
+_conn: aiosqlite.Connection | None = None
+_writer: "WriteBehindQueue | None" = None
+# Неявные транзакции sqlite3 общие на соединение: без блокировки commit() одной
+# корутины зафиксировал бы половину чужой пачки, а rollback() — отменил чужой UPDATE
+_write_lock: asyncio.Lock | None = None
+
+SCHEMA = '''
+    -- Таблица для заявок
+    CREATE TABLE IF NOT EXISTS requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        username TEXT,
+        full_name TEXT,
+        phone TEXT,
+        debt_amount REAL,
+        income_amount REAL,
+        case_description TEXT,
+        ai_analysis TEXT,
+        status TEXT DEFAULT 'new',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- Таблица для истории AI-чата
+    CREATE TABLE IF NOT EXISTS ai_chat_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        question TEXT,
+        answer TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_ai_chat_history_user ON ai_chat_history (user_id, created_at);
+
+    -- Состояние бота между перезапусками (user_data, состояния диалогов)
+    CREATE TABLE IF NOT EXISTS bot_state (
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (kind, key)
+    ) WITHOUT ROWID;
+
+    -- Кеш ответов ИИ
+    CREATE TABLE IF NOT EXISTS ai_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT UNIQUE,
+        answer TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+'''
+
+# ===== Запросы =====
+# Тексты запросов постоянные, поэтому sqlite3 подготавливает каждый один раз
+# и дальше берёт из кеша подготовленных выражений соединения.
+SELECT_CACHE = "SELECT answer, created_at FROM ai_cache WHERE question = ? AND created_at >= datetime('now', ?)"
+SELECT_CACHE_INDEX = "SELECT question, created_at FROM ai_cache WHERE created_at >= datetime('now', ?) ORDER BY created_at"
+DELETE_CACHE = "DELETE FROM ai_cache WHERE question = ?"
+DELETE_EXPIRED_CACHE = "DELETE FROM ai_cache WHERE created_at < datetime('now', ?)"
+UPSERT_CACHE = '''
+    INSERT INTO ai_cache (question, answer) VALUES (?, ?)
+    ON CONFLICT(question) DO UPDATE SET answer = excluded.answer, created_at = CURRENT_TIMESTAMP
+'''
+INSERT_AI_CHAT = "INSERT INTO ai_chat_history (user_id, question, answer) VALUES (?, ?, ?)"
+SELECT_AI_CHAT = '''
+    SELECT question, answer FROM ai_chat_history
+    WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?
+'''
+INSERT_REQUEST = '''
+    INSERT INTO requests (user_id, username, full_name, phone, debt_amount, income_amount, case_description)
+    VALUES (:user_id, :username, :full_name, :phone, :debt_amount, :income_amount, :case_description)
+'''
+SELECT_REQUEST = "SELECT * FROM requests WHERE id = ?"
+SELECT_REQUEST_IDS = "SELECT id FROM requests WHERE status = ? ORDER BY id"
+
+
+# ===== Отложенная запись =====
+class WriteBehindQueue:
+    """Буфер INSERT-ов, который пишется в базу одной транзакцией.
+
+    Сброс происходит, когда накопилось max_rows строк или прошло interval
+    секунд с прошлого сброса, а также при остановке.
+    """
+
+    def __init__(self, conn: aiosqlite.Connection, max_rows: int = DB_WRITE_BATCH_SIZE,
+                 interval: float = DB_WRITE_FLUSH_MS / 1000):
+        self.conn = conn
+        self.max_rows = max_rows
+        self.interval = interval
+        self.commits = 0
+        self._rows: list[tuple[str, tuple]] = []
+        self._full = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task | None = None
+
+    def add(self, sql: str, params: tuple):
+        self._rows.append((sql, params))
+        if len(self._rows) >= self.max_rows:
+            self._full.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Без cancel(): отмена посреди flush() потеряла бы уже вынутую из буфера пачку.
+        # Цикл доделывает текущий сброс и выходит, остаток пишем здесь.
+        if self._task is not None:
+            self._stopping = True
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                return
+            await self.flush()
+
+    async def flush(self):
+        self._full.clear()
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        try:
+            with measure(DB_LATENCY, "flush"):
+                async with transaction(self.conn):
+                    # Подряд идущие строки одного запроса пишем через executemany
+                    start = 0
+                    for i in range(1, len(rows) + 1):
+                        if i == len(rows) or rows[i][0] != rows[start][0]:
+                            await self.conn.executemany(rows[start][0], [params for _, params in rows[start:i]])
+                            start = i
+            self.commits += 1
+            DB_ROWS_WRITTEN.inc(len(rows))
+        except Exception:
+            logger.exception("Не удалось записать %d строк в базу", len(rows))
+
+
+@asynccontextmanager
+async def transaction(conn: aiosqlite.Connection | None = None):
+    """Запись на общем соединении одной транзакцией: commit в конце, rollback при ошибке.
+
+    Все изменения через _conn должны идти внутри transaction().
+    """
+    conn = conn or get_db()
+    async with _write_lock:
+        try:
+            yield conn
+        except BaseException:
+            await conn.rollback()
+            raise
+        await conn.commit()
+
+
+async def init_db():
+    global _conn, _writer, _write_lock
+    if _conn is not None:
+        return
+    _write_lock = asyncio.Lock()
+    _conn = await aiosqlite.connect(DB_NAME)
+    await _conn.execute("PRAGMA journal_mode=WAL")
+    await _conn.execute("PRAGMA synchronous=NORMAL")
+    await _migrate_ai_cache(_conn)
+    await _conn.executescript(SCHEMA)
+    await _conn.commit()
+    _writer = WriteBehindQueue(_conn)
+    _writer.start()
+
+
+async def close_db():
+    global _conn, _writer
+    if _writer is not None:
+        await _writer.stop()
+        _writer = None
+    if _conn is not None:
+        await _conn.close()
+        _conn = None
+
+
+def get_db() -> aiosqlite.Connection:
+    if _conn is None:
+        raise RuntimeError("База данных не инициализирована: вызовите init_db()")
+    return _conn
+
+
+async def _migrate_ai_cache(conn: aiosqlite.Connection):
+    # Старый ai_client создавал ai_cache(question PRIMARY KEY, answer) без id/created_at.
+    # Переносим такие записи в общую схему.
+    async with conn.execute("PRAGMA table_info(ai_cache)") as cur:
+        columns = {row[1] for row in await cur.fetchall()}
+    if not columns or "created_at" in columns:
+        return
+    await conn.execute("ALTER TABLE ai_cache RENAME TO ai_cache_old")
+    await conn.executescript(SCHEMA)
+    await conn.execute("INSERT INTO ai_cache (question, answer) SELECT question, answer FROM ai_cache_old")
+    await conn.execute("DROP TABLE ai_cache_old")
+
+
+# ===== Кеширование ответов =====
+async def get_cached_answer(question: str, ttl: float):
+    """(answer, created_at) для записи моложе ttl секунд или None."""
+    with measure(DB_LATENCY, "cache_select"):
+        async with get_db().execute(SELECT_CACHE, (question, f"-{int(ttl)} seconds")) as cur:
+            return await cur.fetchone()
+
+
+async def load_cache_index(ttl: float):
+    """Все живые вопросы кеша от старых к новым: [(question, created_at), ...]."""
+    async with get_db().execute(SELECT_CACHE_INDEX, (f"-{int(ttl)} seconds",)) as cur:
+        return await cur.fetchall()
+
+
+def get_writer() -> WriteBehindQueue:
+    if _writer is None:
+        raise RuntimeError("База данных не инициализирована: вызовите init_db()")
+    return _writer
+
+
+def save_cache(question: str, answer: str):
+    get_writer().add(UPSERT_CACHE, (question, answer))
+
+
+def delete_cache(question: str):
+    get_writer().add(DELETE_CACHE, (question,))
+
+
+def delete_expired_cache(ttl: float):
+    get_writer().add(DELETE_EXPIRED_CACHE, (f"-{int(ttl)} seconds",))
+
+
+# ===== Сохранение истории чата =====
+def save_ai_chat(user_id: int, question: str, answer: str):
+    get_writer().add(INSERT_AI_CHAT, (user_id, question, answer))
+
+
+async def load_ai_chat(user_id: int, limit: int) -> list[tuple[str, str]]:
+    """Последние limit пар (вопрос, ответ) пользователя, от старых к новым."""
+    with measure(DB_LATENCY, "chat_select"):
+        async with get_db().execute(SELECT_AI_CHAT, (user_id, limit)) as cur:
+            rows = await cur.fetchall()
+    return rows[::-1]
+
+
+# ===== Заявки =====
+# Заявки пишутся сразу, мимо буфера: нужен id и гарантия, что заявка
+# не потеряется, если процесс упадёт до сброса буфера.
+REQUEST_FIELDS = ("user_id", "username", "full_name", "phone", "debt_amount", "income_amount", "case_description")
+
+
+async def save_request(data: dict) -> int:
+    conn = get_db()
+    with measure(DB_LATENCY, "request_insert"):
+        async with transaction(conn):
+            cur = await conn.execute(INSERT_REQUEST, {field: data.get(field) for field in REQUEST_FIELDS})
+    return cur.lastrowid
+
+
+async def get_request(request_id: int) -> dict | None:
+    async with get_db().execute(SELECT_REQUEST, (request_id,)) as cur:
+        row = await cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip((column[0] for column in cur.description), row))
+
+
+async def get_request_ids(status: str) -> list[int]:
+    async with get_db().execute(SELECT_REQUEST_IDS, (status,)) as cur:
+        return [row[0] for row in await cur.fetchall()]
+
+
+async def update_request(request_id: int, **fields):
+    conn = get_db()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with measure(DB_LATENCY, "request_update"):
+        async with transaction(conn):
+            await conn.execute(f"UPDATE requests SET {assignments} WHERE id = ?", (*fields.values(), request_id))
@@ -1,14 +1,79 @@
+import asyncio
+import time
 from telegram import Update
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import ContextTypes
 from keyboards import main_keyboard
-from ai_client import ask_ai_lawyer, save_ai_chat
+from ai_client import ask_ai_lawyer, stream_ai_lawyer, is_error_answer
+from config import AI_STREAMING, STREAM_EDIT_INTERVAL
+from chat_history import chat_history
+from rate_limit import UserLimitExceeded
 from states import MAIN_MENU
 
+ANSWER_PREFIX = "🤖 Ответ DeepSeek AI:\n\n"
+
 async def handle_ai_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     question = update.message.text
     user_id = update.message.from_user.id
     await update.message.reply_chat_action(action='typing')
-    answer = await ask_ai_lawyer(question)
-    save_ai_chat(user_id, question, answer)
-    await update.message.reply_text(f"🤖 Ответ DeepSeek AI:\n\n{answer}", reply_markup=main_keyboard())
+    history = await chat_history.messages(user_id)
+    try:
+        if AI_STREAMING:
+            answer = await reply_streaming(update, question, history, user_id)
+        else:
+            answer = await ask_ai_lawyer(question, history=history, user_id=user_id)
+            await update.message.reply_text(f"{ANSWER_PREFIX}{answer}", reply_markup=main_keyboard())
+    except UserLimitExceeded as e:
+        # Лимит тратится только на платные запросы к DeepSeek, FAQ и кеш доступны всегда
+        await update.message.reply_text(str(e), reply_markup=main_keyboard())
+        return MAIN_MENU
+    # Текст ошибки и пустой ответ — не ответ: в истории они попали бы в
+    # следующие промпты как реплика ИИ
+    if answer and not is_error_answer(answer):
+        chat_history.add(user_id, question, answer)
     return MAIN_MENU
+
+async def reply_streaming(update: Update, question: str, history: list[dict] | None = None,
+                          user_id: int | None = None) -> str:
+    """Отправляет первый кусок ответа сразу и дописывает сообщение правками.
+
+    Правки идут не чаще STREAM_EDIT_INTERVAL, чтобы не упереться в лимиты Telegram.
+    """
+    message = None
+    text = ""
+    shown = ""
+    next_edit = 0.0
+    async for chunk in stream_ai_lawyer(question, history=history, user_id=user_id):
+        text += chunk
+        if message is None:
+            message = await update.message.reply_text(f"{ANSWER_PREFIX}{text}", reply_markup=main_keyboard())
+            shown = text
+            next_edit = time.monotonic() + STREAM_EDIT_INTERVAL
+        elif time.monotonic() >= next_edit and text != shown:
+            next_edit = await _edit(message, text)
+            shown = text
+
+    answer = text.strip()
+    if message is None:
+        await update.message.reply_text(f"{ANSWER_PREFIX}{answer}", reply_markup=main_keyboard())
+    elif answer != shown:
+        await _edit(message, answer, final=True)
+    return answer
+
+async def _edit(message, text: str, final: bool = False) -> float:
+    """Правит сообщение и возвращает время, раньше которого следующую правку не делать.
+
+    Промежуточную правку при RetryAfter пропускаем, финальную — дожидаемся.
+    """
+    while True:
+        try:
+            await message.edit_text(f"{ANSWER_PREFIX}{text}")
+        except RetryAfter as e:
+            if not final:
+                return time.monotonic() + e.retry_after
+            await asyncio.sleep(e.retry_after)
+            continue
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+        return time.monotonic() + STREAM_EDIT_INTERVAL
@@ -1,30 +1,34 @@
+from telegram import Bot
+from telegram.helpers import escape_markdown
 from config import LAWYER_CHAT_ID
-from ai_client import analyze_case_with_ai
 
-async def notify_lawyer(context, user_data: dict):
-    ai_analysis = await analyze_case_with_ai(user_data)
+async def notify_lawyer(bot: Bot, lead: dict):
+    """Отправляет заявку юристу. Ошибки отправки пробрасывает: повторяет их очередь заявок."""
+    def field(name, default):
+        value = lead.get(name)
+        return escape_markdown(str(value)) if value not in (None, "") else default
+
+    # Внутри `...` экранирование Markdown не работает, убираем только обратные кавычки
+    phone = str(lead.get('phone') or 'не указан').replace('`', "'")
 
     message = f"""
-🚨 *НОВАЯ ЗАЯВКА* #{user_data['request_id']}
+🚨 *НОВАЯ ЗАЯВКА* #{lead['id']}
 
-*Клиент:* {user_data['full_name']}
-*Телефон:* `{user_data['phone']}`
-*Username:* @{user_data['username']}
-*Долг:* {user_data.get('debt_amount', 'не указан')} руб.
-*Доход:* {user_data.get('income_amount', 'не указан')} руб.
+*Клиент:* {field('full_name', 'не указано')}
+*Телефон:* `{phone}`
+*Username:* @{field('username', 'нет username')}
+*Долг:* {field('debt_amount', 'не указан')} руб.
+*Доход:* {field('income_amount', 'не указан')} руб.
 
 *🤖 АНАЛИЗ ИИ:*
-{ai_analysis}
+{field('ai_analysis', 'недоступен')}
 
 *Описание ситуации:*
-{user_data.get('case_description', 'не указано')}
+{field('case_description', 'не указано')}
     """
 
-    try:
-        await context.bot.send_message(
-            chat_id=LAWYER_CHAT_ID,
-            text=message,
-            parse_mode="Markdown"
-        )
-    except Exception as e:
-        print(f"❌ Ошибка отправки уведомления: {e}")
+    await bot.send_message(
+        chat_id=LAWYER_CHAT_ID,
+        text=message,
+        parse_mode="Markdown"
+    )
@@ -1,6 +1,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from keyboards import main_keyboard
+from leads import lead_pipeline
 from states import MAIN_MENU, CASE_DESCRIPTION
 
 async def handle_contact_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -17,5 +18,10 @@ async def handle_case_description(update: Update, context: ContextTypes.DEFAULT_
         return CASE_DESCRIPTION
     else:
         context.user_data['case_description'] = update.message.text
+        # Заявка сохраняется в базу, анализ и уведомление юриста идут в фоне
+        await lead_pipeline.submit(context.user_data)
+        # Следующая заявка снова спросит телефон и описание
+        context.user_data.pop('phone', None)
+        context.user_data.pop('case_description', None)
         await update.message.reply_text("Спасибо! Ваши данные сохранены.", reply_markup=main_keyboard())
         return MAIN_MENU
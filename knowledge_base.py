@@ -0,0 +1,162 @@
+import json
+import logging
+import math
+import os
+from collections import Counter
+from config import KB_PATH, KB_ANSWER_THRESHOLD, KB_CONTEXT_PASSAGES
+from text_utils import MEANING_WORDS, normalize_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+DISCLAIMER = "\n\nЭто общая информация. Для разбора вашей ситуации нажмите «📞 Связаться с юристом»."
+
+# Параметры BM25
+K1 = 1.5
+B = 0.75
+CANDIDATES = 5  # сколько лучших по BM25 статей сверять с формулировками вопроса
+
+
+class KnowledgeBase:
+    """BM25 по статьям FAQ из data/faq.json.
+
+    Индекс строится один раз в load(). Если вопрос почти целиком покрыт
+    формулировками одной статьи, answer() отвечает ею без ИИ; иначе
+    context_for() отдаёт лучшие статьи для промпта.
+    """
+
+    def __init__(self, path: str = KB_PATH, threshold: float = KB_ANSWER_THRESHOLD,
+                 passages: int = KB_CONTEXT_PASSAGES):
+        self.path = path
+        self.threshold = threshold
+        self.passages = passages
+        self.entries: list[dict] = []
+        self._postings: dict[str, list[tuple[int, int]]] = {}  # термин -> [(статья, tf)]
+        self._idf: dict[str, float] = {}
+        self._lengths: list[int] = []
+        self._avg_length = 0.0
+        self._max_idf = 1.0
+        self._question_terms: list[set[str]] = []  # все термины формулировок статьи
+        self._questions: list[list[set[str]]] = []  # термины каждой формулировки
+        self._exact: dict[str, int] = {}  # нормализованная формулировка -> статья
+        self.answered = 0
+        self.with_context = 0
+
+    def load(self):
+        if not os.path.exists(self.path):
+            logger.warning("База знаний %s не найдена, ответы только от ИИ", self.path)
+            return
+        with open(self.path, encoding="utf-8") as f:
+            self.build(json.load(f))
+        logger.info("База знаний: %d статей, %d терминов", len(self.entries), len(self._postings))
+
+    def build(self, entries: list[dict]):
+        self.entries = entries
+        postings: dict[str, list[tuple[int, int]]] = {}
+        self._lengths = []
+        self._question_terms = []
+        self._questions = []
+        self._exact = {}
+        for doc_id, entry in enumerate(entries):
+            question_terms = [term for question in entry["questions"] for term in tokenize(question)]
+            terms = Counter(question_terms + tokenize(entry["answer"]))
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+            self._lengths.append(sum(terms.values()))
+            self._question_terms.append(set(question_terms))
+            self._questions.append([set(tokenize(question)) for question in entry["questions"]])
+            for question in entry["questions"]:
+                self._exact.setdefault(normalize_text(question), doc_id)
+        n = len(entries)
+        self._postings = postings
+        self._idf = {term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) for term, docs in postings.items()}
+        self._avg_length = sum(self._lengths) / n if n else 0.0
+        self._max_idf = max(self._idf.values(), default=1.0)
+
+    def search(self, question: str, k: int = 3) -> list[tuple[dict, float]]:
+        return [(self.entries[doc_id], score) for doc_id, score in self._rank(question, k)]
+
+    def _rank(self, question: str, k: int) -> list[tuple[int, float]]:
+        scores: dict[int, float] = {}
+        for term in set(tokenize(question)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self._postings[term]:
+                norm = K1 * (1 - B + B * self._lengths[doc_id] / self._avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def _coverage(self, question: str, doc_id: int) -> float:
+        """Доля веса вопроса, которая есть в формулировках статьи.
+
+        Незнакомые индексу слова весят как самые редкие: вопрос с ними
+        («ипотека на дачу под Тверью») не считается уверенным совпадением.
+        """
+        terms = set(tokenize(question))
+        if not terms:
+            return 0.0
+        total = sum(self._idf.get(term, self._max_idf) for term in terms)
+        covered = sum(self._idf[term] for term in terms & self._question_terms[doc_id])
+        return covered / total
+
+    def _closest_question(self, question: str, doc_id: int) -> float:
+        """Насколько вопрос совпадает с ближайшей формулировкой статьи, по весу этой формулировки.
+
+        Различает статьи с одинаковым покрытием: «квартира» ближе к «Что
+        будет с моей квартирой?», чем к «Можно ли сохранить квартиру в ипотеке?».
+        Формулировки с другими отрицаниями и модальными словами не в счёт, как
+        в SimilarityIndex: «не» встречается в ответах и весит мало, покрытие
+        его почти не замечает.
+        """
+        terms = set(tokenize(question))
+        markers = terms & MEANING_WORDS
+        best = 0.0
+        for question_terms in self._questions[doc_id]:
+            if question_terms & MEANING_WORDS != markers:
+                continue
+            total = sum(self._idf.get(term, self._max_idf) for term in question_terms)
+            if total:
+                best = max(best, sum(self._idf[term] for term in terms & question_terms) / total)
+        return best
+
+    def match(self, question: str) -> dict | None:
+        """Статья FAQ, которая уверенно отвечает на вопрос, иначе None.
+
+        Сначала точное совпадение с формулировкой, затем среди лучших по BM25
+        статей — та, чьи формулировки покрывают вопрос полнее всего. Ранг
+        BM25 учитывает и текст ответа, поэтому сам по себе статью не выбирает.
+        Если ни одна формулировка статьи не совпадает с вопросом по отрицаниям
+        («Какие документы не нужны?»), отвечает ИИ, а статья идёт ему в контекст.
+        """
+        doc_id = self._exact.get(normalize_text(question))
+        if doc_id is not None:
+            return self.entries[doc_id]
+        best, best_key = None, None
+        for doc_id, score in self._rank(question, k=CANDIDATES):
+            key = (self._coverage(question, doc_id), self._closest_question(question, doc_id), score)
+            if best_key is None or key > best_key:
+                best, best_key = doc_id, key
+        if best is None or best_key[0] < self.threshold or not best_key[1]:
+            return None
+        return self.entries[best]
+
+    def answer(self, question: str) -> str | None:
+        """Ответ из FAQ, если совпадение уверенное, иначе None."""
+        entry = self.match(question)
+        if entry is None:
+            return None
+        self.answered += 1
+        return entry["answer"] + DISCLAIMER
+
+    def context_for(self, question: str) -> str:
+        """Лучшие статьи FAQ для контекста промпта."""
+        found = self.search(question, k=self.passages)
+        if found:
+            self.with_context += 1
+        return "\n\n".join(entry["answer"] for entry, _ in found)
+
+    def stats(self) -> dict:
+        return {"answered": self.answered, "with_context": self.with_context}
+
+
+knowledge_base = KnowledgeBase()
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from telegram import Bot
+import db
+from ai_client import analyze_case_with_ai
+from config import LEAD_WORKERS, LEAD_MAX_ATTEMPTS, LEAD_RETRY_DELAY
+from handlers.common import notify_lawyer
+
+logger = logging.getLogger(__name__)
+
+# Статусы заявки в таблице requests
+STATUS_NEW = "new"  # сохранена, юрист ещё не уведомлён
+STATUS_NOTIFIED = "notified"
+STATUS_FAILED = "failed"  # уведомить не удалось за LEAD_MAX_ATTEMPTS попыток
+
+
+class LeadPipeline:
+    """Фоновая обработка заявок: ИИ-анализ и уведомление юриста.
+
+    Заявка сначала сохраняется в requests со статусом new, поэтому при
+    перезапуске необработанные заявки подхватываются из базы.
+    """
+
+    def __init__(self, workers: int = LEAD_WORKERS, max_attempts: int = LEAD_MAX_ATTEMPTS,
+                 retry_delay: float = LEAD_RETRY_DELAY):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.bot: Bot | None = None
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self, bot: Bot):
+        self.bot = bot
+        pending = await db.get_request_ids(STATUS_NEW)
+        for request_id in pending:
+            self._queue.put_nowait(request_id)
+        if pending:
+            logger.info("Заявки: возобновлено %d необработанных", len(pending))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Незавершённые заявки остаются в статусе new и будут обработаны при следующем старте
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, data: dict) -> int:
+        request_id = await db.save_request(data)
+        self._queue.put_nowait(request_id)
+        return request_id
+
+    async def _worker(self):
+        while True:
+            request_id = await self._queue.get()
+            try:
+                await self._process(request_id)
+            except Exception:
+                logger.exception("Заявка #%d: ошибка обработки", request_id)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, request_id: int):
+        lead = await db.get_request(request_id)
+        if lead is None or lead["status"] != STATUS_NEW:
+            return
+
+        if not lead["ai_analysis"]:
+            # Без _retry: временные ошибки API уже повторяет _create_completion,
+            # а каждая лишняя попытка — платный вызов и токен общего лимита
+            try:
+                lead["ai_analysis"] = await analyze_case_with_ai(lead)
+                await db.update_request(request_id, ai_analysis=lead["ai_analysis"])
+            except Exception as e:
+                # Юрист получит заявку и без анализа
+                logger.warning("Заявка #%d: ИИ-анализ не удался: %s", request_id, e)
+
+        try:
+            await self._retry(notify_lawyer, self.bot, lead)
+        except Exception as e:
+            logger.error("Заявка #%d: не удалось уведомить юриста: %s", request_id, e)
+            await db.update_request(request_id, status=STATUS_FAILED)
+            return
+        await db.update_request(request_id, status=STATUS_NOTIFIED)
+
+    async def _retry(self, func, *args):
+        for attempt in range(self.max_attempts):
+            try:
+                return await func(*args)
+            except Exception as e:
+                if attempt == self.max_attempts - 1:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning("%s: %s, повтор через %.1f с", func.__name__, e, delay)
+                await asyncio.sleep(delay)
+
+
+lead_pipeline = LeadPipeline()
@@ -1,6 +1,8 @@
+import asyncio
 import logging
 from telegram.ext import (
     Application,
+    ApplicationBuilder,
     CommandHandler,
     ConversationHandler,
     MessageHandler,
@@ -10,7 +12,16 @@ from handlers.start import start, cancel
 from handlers.consultation import handle_main_menu, handle_debt_amount, handle_income
 from handlers.contact import handle_contact_info, handle_case_description
 from handlers.ai_chat import handle_ai_chat
-from db import init_db
+from db import init_db, close_db
+from ai_cache import answer_cache
+from persistence import create_persistence
+from update_processor import PerChatUpdateProcessor
+from leads import lead_pipeline
+from rate_limit import deepseek_limiter, user_limiter
+from knowledge_base import knowledge_base
+from chat_history import chat_history
+from metrics import StatsGauges, instrument_handler, start_metrics_server
+from config import BOT_TOKEN, BOT_MODE, CONCURRENT_UPDATES
 from states import MAIN_MENU, CALCULATOR_DEBT, CALCULATOR_INCOME, CONTACT_INFO, CASE_DESCRIPTION, AI_CHAT
 
 # ===== Настройка логирования =====
@@ -21,34 +32,87 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# ===== Инициализация базы данных =====
-init_db()
+# ===== Счётчики компонентов в /metrics =====
+StatsGauges("bot_ai_cache", answer_cache.stats)
+StatsGauges("bot_kb", knowledge_base.stats)
+StatsGauges("bot_ai_limit", deepseek_limiter.stats)
+StatsGauges("bot_user_limit", user_limiter.stats)
+StatsGauges("bot_history", chat_history.stats)
+
+_metrics_server: asyncio.Server | None = None
+
+# ===== База данных и фоновые задачи живут столько же, сколько приложение =====
+async def on_startup(application: Application):
+    global _metrics_server
+    await init_db()
+    await answer_cache.load()
+    knowledge_base.load()
+    await lead_pipeline.start(application.bot)
+    _metrics_server = await start_metrics_server()
+
+async def on_stop(application: Application):
+    # Пока бот ещё работает: прерванные заявки останутся в статусе new
+    await lead_pipeline.stop()
+
+async def on_shutdown(application: Application):
+    global _metrics_server
+    logger.info("Кеш ИИ: %s, база знаний: %s", answer_cache.stats(), knowledge_base.stats())
+    logger.info("Лимиты DeepSeek: %s, пользователей: %s", deepseek_limiter.stats(), user_limiter.stats())
+    if _metrics_server is not None:
+        _metrics_server.close()
+        await _metrics_server.wait_closed()
+        _metrics_server = None
+    await close_db()
 
 # ===== Создание приложения =====
-from config import BOT_TOKEN
-application = Application.builder().token(BOT_TOKEN).build()
-
-# ===== ConversationHandler для диалогов =====
-conv_handler = ConversationHandler(
-    entry_points=[CommandHandler('start', start)],
-    states={
-        MAIN_MENU: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_main_menu)],
-        CALCULATOR_DEBT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_debt_amount)],
-        CALCULATOR_INCOME: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_income)],
-        CONTACT_INFO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_contact_info)],
-        CASE_DESCRIPTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_case_description)],
-        AI_CHAT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_ai_chat)],
-    },
-    fallbacks=[CommandHandler('cancel', cancel)],
-    name="conversation_handler",
-    persistent=False
-)
+def build_application(builder: ApplicationBuilder | None = None) -> Application:
+    if builder is None:
+        builder = Application.builder().token(BOT_TOKEN)
+    # user_data и состояния диалогов переживают перезапуск (PERSISTENCE_BACKEND)
+    persistence = create_persistence()
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    # Апдейты обрабатываются параллельно: пока один пользователь ждёт ответа ИИ,
+    # остальные не стоят в очереди за ним. Апдейты одного чата — по очереди,
+    # иначе ConversationHandler увидит устаревшее состояние диалога
+    application = (
+        builder
+        .concurrent_updates(PerChatUpdateProcessor(CONCURRENT_UPDATES))
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
+
+    # ===== ConversationHandler для диалогов =====
+    # Каждый обработчик обёрнут instrument_handler: латентность и ошибки по имени
+    text = filters.TEXT & ~filters.COMMAND
+    conv_handler = ConversationHandler(
+        entry_points=[CommandHandler('start', instrument_handler("start", start))],
+        states={
+            MAIN_MENU: [MessageHandler(text, instrument_handler("main_menu", handle_main_menu))],
+            CALCULATOR_DEBT: [MessageHandler(text, instrument_handler("calculator_debt", handle_debt_amount))],
+            CALCULATOR_INCOME: [MessageHandler(text, instrument_handler("calculator_income", handle_income))],
+            CONTACT_INFO: [MessageHandler(text, instrument_handler("contact_info", handle_contact_info))],
+            CASE_DESCRIPTION: [MessageHandler(text, instrument_handler("case_description", handle_case_description))],
+            AI_CHAT: [MessageHandler(text, instrument_handler("ai_chat", handle_ai_chat))],
+        },
+        fallbacks=[CommandHandler('cancel', instrument_handler("cancel", cancel))],
+        name="conversation_handler",
+        persistent=persistence is not None
+    )
 
-application.add_handler(conv_handler)
+    application.add_handler(conv_handler)
 
-# ===== Глобальный обработчик AI-чат для сообщений вне диалога =====
-application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_ai_chat))
+    # ===== Глобальный обработчик AI-чат для сообщений вне диалога =====
+    application.add_handler(MessageHandler(text, instrument_handler("ai_chat_global", handle_ai_chat)))
+    return application
 
 # ===== Запуск бота =====
-print("🤖 AI-бот запущен...")
-application.run_polling()
+if __name__ == "__main__":
+    print("🤖 AI-бот запущен...")
+    if BOT_MODE == "webhook":
+        from webhook import run_webhook
+        asyncio.run(run_webhook(build_application(Application.builder().token(BOT_TOKEN).updater(None))))
+    else:
+        build_application().run_polling()
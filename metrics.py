@@ -0,0 +1,242 @@
+"""Метрики в формате Prometheus и выборочные трассировки апдейтов.
+
+Метрики собираются в памяти процесса и отдаются по GET /metrics встроенным
+HTTP-сервером, если задан METRICS_PORT. С вероятностью TRACE_SAMPLE_RATE апдейт
+трассируется: все замеры внутри обработчика пишутся в лог одной строкой.
+"""
+import asyncio
+import functools
+import logging
+import random
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import METRICS_HOST, METRICS_PORT, TRACE_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: list = []
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# ===== Типы метрик =====
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values: dict[tuple, object] = {}
+        _registry.append(self)
+
+    def labels(self, *values):
+        value = self._values.get(values)
+        if value is None:
+            value = self._values[values] = self._new_value()
+        return value
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, value in self._values.items():
+            lines.extend(self._render_value(values, value))
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _render_value(self, values, value):
+        yield f"{self.name}{_format_labels(self.label_names, values)} {value.value}"
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        super().__init__(name, help, labels)
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_value(self, values, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets, value.counts):
+            cumulative += count
+            le = 'le="%s"' % bound
+            yield f"{self.name}_bucket{_format_labels(self.label_names, values, le)} {cumulative}"
+        le = 'le="+Inf"'
+        yield f"{self.name}_bucket{_format_labels(self.label_names, values, le)} {value.count}"
+        yield f"{self.name}_sum{_format_labels(self.label_names, values)} {value.sum}"
+        yield f"{self.name}_count{_format_labels(self.label_names, values)} {value.count}"
+
+
+class StatsGauges:
+    """Числовые поля словаря stats() компонента как gauge-метрики.
+
+    Значения читаются только при запросе /metrics, на горячем пути ничего не считается.
+    """
+
+    def __init__(self, prefix: str, stats):
+        self.prefix = prefix
+        self.stats = stats
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        lines = []
+        for key, value in self.stats().items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {self.prefix}_{key} gauge")
+                lines.append(f"{self.prefix}_{key} {value}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ===== Метрики бота =====
+HANDLER_LATENCY = Histogram("bot_handler_seconds", "Время обработки апдейта обработчиком", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Исключения в обработчиках", ("handler",))
+AI_LATENCY = Histogram("bot_ai_request_seconds", "Длительность запроса к DeepSeek", ("kind",))
+AI_ERRORS = Counter("bot_ai_errors_total", "Запросы к DeepSeek, завершившиеся ошибкой", ("kind",))
+AI_TTFT = Histogram("bot_ai_first_token_seconds", "Время до первого токена в потоковом режиме")
+AI_QUEUE_WAIT = Histogram("bot_ai_queue_wait_seconds", "Ожидание в очереди к DeepSeek: места и токена общего лимита")
+DB_LATENCY = Histogram("bot_db_seconds", "Длительность операций SQLite", ("operation",))
+DB_ROWS_WRITTEN = Counter("bot_db_rows_written_total", "Строки, записанные отложенной записью")
+
+
+# ===== Трассировки =====
+# Список замеров текущего апдейта или None, если апдейт не трассируется
+_current_trace: ContextVar[list | None] = ContextVar("trace", default=None)
+
+
+@contextmanager
+def measure(histogram: Histogram, *labels):
+    """Замеряет блок в histogram и, если апдейт трассируется, добавляет замер в трассировку."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.labels(*labels).observe(elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((":".join((histogram.name, *labels)), elapsed))
+
+
+def instrument_handler(name: str, callback):
+    """Оборачивает обработчик PTB: латентность, ошибки и выборочная трассировка."""
+    latency = HANDLER_LATENCY.labels(name)
+    errors = HANDLER_ERRORS.labels(name)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        trace = [] if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE else None
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            latency.observe(elapsed)
+            _current_trace.reset(token)
+            if trace is not None:
+                spans = ", ".join(f"{span}={duration * 1000:.1f}мс" for span, duration in trace)
+                logger.info("trace update=%s handler=%s %.1fмс: %s",
+                            getattr(update, "update_id", "?"), name, elapsed * 1000, spans or "-")
+
+    return wrapper
+
+
+# ===== HTTP-эндпоинт /metrics =====
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        if request_line.split(b" ")[:2] == [b"GET", b"/metrics"]:
+            body = render().encode()
+            status = b"200 OK"
+        else:
+            body = b"not found\n"
+            status = b"404 Not Found"
+        writer.write(
+            b"HTTP/1.1 " + status + b"\r\n"
+            b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+            b"Connection: close\r\n\r\n" + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> asyncio.Server | None:
+    if not port:
+        return None
+    try:
+        server = await asyncio.start_server(_serve, host, port)
+    except OSError as e:
+        # Метрики не повод не запускать бота
+        logger.error("Метрики: не удалось занять %s:%d: %s", host, port, e)
+        return None
+    logger.info("Метрики: http://%s:%d/metrics", host, port)
+    return server
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+from telegram.ext import BasePersistence, PersistenceInput
+import db
+from config import PERSISTENCE_BACKEND, PERSISTENCE_INTERVAL
+from metrics import measure, DB_LATENCY
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = "user_data"
+
+
+def _conversation_kind(name: str) -> str:
+    return f"conversation:{name}"
+
+
+# ===== Хранилище =====
+# Запись — (kind, key) -> JSON. key — строка: id пользователя или ключ диалога.
+class SqliteBackend:
+    """Таблица bot_state в основной базе бота."""
+
+    UPSERT = '''
+        INSERT INTO bot_state (kind, key, value) VALUES (?, ?, ?)
+        ON CONFLICT(kind, key) DO UPDATE SET value = excluded.value
+    '''
+    DELETE = "DELETE FROM bot_state WHERE kind = ? AND key = ?"
+    SELECT = "SELECT key, value FROM bot_state WHERE kind = ?"
+
+    async def load(self, kind: str) -> dict[str, str]:
+        # Persistence читается в Application.initialize(), раньше post_init
+        await db.init_db()
+        async with db.get_db().execute(self.SELECT, (kind,)) as cur:
+            return dict(await cur.fetchall())
+
+    async def save(self, rows: dict[tuple[str, str], str | None]):
+        async with db.transaction() as conn:
+            await conn.executemany(self.UPSERT, [(kind, key, value) for (kind, key), value in rows.items() if value is not None])
+            await conn.executemany(self.DELETE, [(kind, key) for (kind, key), value in rows.items() if value is None])
+
+
+# ===== Persistence для PTB =====
+class BotPersistence(BasePersistence):
+    """Хранит user_data и состояния ConversationHandler.
+
+    PTB раз в update_interval передаёт данные пользователей, которых
+    касались апдейты. Здесь они сравниваются с последней сохранённой версией,
+    и в хранилище одной пачкой уходят только реально изменившиеся.
+
+    Хранилище читается только при старте (refresh_* ничего не делают, а
+    состояния ConversationHandler PTB и так загружает один раз), поэтому
+    писать в одно хранилище может только один процесс бота.
+    """
+
+    def __init__(self, backend, update_interval: float = PERSISTENCE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.backend = backend
+        self._saved: dict[tuple[str, str], str] = {}  # что уже лежит в хранилище
+        self._dirty: dict[tuple[str, str], str | None] = {}  # None — удалить
+        self._flush_task: asyncio.Task | None = None
+
+    # ----- загрузка -----
+    async def get_user_data(self) -> dict[int, dict]:
+        rows = await self.backend.load(USER_DATA)
+        for key, value in rows.items():
+            self._saved[(USER_DATA, key)] = value
+        return {int(key): json.loads(value) for key, value in rows.items()}
+
+    async def get_conversations(self, name: str) -> dict:
+        kind = _conversation_kind(name)
+        rows = await self.backend.load(kind)
+        for key, value in rows.items():
+            self._saved[(kind, key)] = value
+        return {tuple(json.loads(key)): json.loads(value) for key, value in rows.items()}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # ----- изменения -----
+    async def update_user_data(self, user_id: int, data: dict):
+        self._mark((USER_DATA, str(user_id)), json.dumps(data, ensure_ascii=False))
+
+    async def drop_user_data(self, user_id: int):
+        self._mark((USER_DATA, str(user_id)), None)
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None):
+        value = None if new_state is None else json.dumps(new_state)
+        self._mark((_conversation_kind(name), json.dumps(list(key))), value)
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    # ----- запись -----
+    def _mark(self, row: tuple[str, str], value: str | None):
+        if self._saved.get(row) == value:
+            self._dirty.pop(row, None)
+            return
+        self._dirty[row] = value
+        # PTB вызывает update_* пачкой через asyncio.gather: задача записи
+        # стартует после них и забирает все изменения одной транзакцией
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._write())
+
+    async def _write(self):
+        await asyncio.sleep(0)
+        if not self._dirty:
+            return
+        rows, self._dirty = self._dirty, {}
+        try:
+            with measure(DB_LATENCY, "state_flush"):
+                await self.backend.save(rows)
+        except Exception:
+            logger.exception("Не удалось сохранить состояние %d пользователей", len(rows))
+            # Вернём строки в очередь, если их не успели изменить заново
+            for row, value in rows.items():
+                self._dirty.setdefault(row, value)
+            return
+        for row, value in rows.items():
+            if value is None:
+                self._saved.pop(row, None)
+            else:
+                self._saved[row] = value
+
+    async def flush(self):
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._write()
+
+
+def create_persistence(kind: str = PERSISTENCE_BACKEND) -> BotPersistence | None:
+    if kind == "sqlite":
+        return BotPersistence(SqliteBackend())
+    return None
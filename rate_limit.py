@@ -0,0 +1,222 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import date
+from metrics import AI_QUEUE_WAIT
+from config import (
+    AI_MAX_CONCURRENCY,
+    AI_RATE_PER_SECOND,
+    AI_RATE_BURST,
+    AI_QUEUE_TIMEOUT,
+    USER_RATE_PER_MINUTE,
+    USER_RATE_BURST,
+    USER_DAILY_QUOTA,
+)
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class UserLimitExceeded(RateLimitExceeded):
+    """Пользователь исчерпал свой лимит; текст исключения — отказ для него."""
+
+
+# ===== Общий лимит на DeepSeek =====
+class FairTokenBucket:
+    """Token bucket с очередью FIFO и ограничением одновременных запросов.
+
+    Если токенов или мест нет, запрос не отклоняется, а ждёт своей очереди
+    (не дольше timeout): всплеск нагрузки превращается в задержку, а не в
+    ошибки API. rate <= 0 — без лимита токенов, остаётся только concurrency.
+    """
+
+    OVERLOADED = "сервис перегружен, попробуйте через минуту"
+
+    def __init__(self, rate: float = AI_RATE_PER_SECOND, burst: int = AI_RATE_BURST,
+                 timeout: float = AI_QUEUE_TIMEOUT, concurrency: int = AI_MAX_CONCURRENCY):
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(concurrency)
+        self._slot_waiting = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._wakeup: asyncio.TimerHandle | None = None
+        self.acquired = 0
+        self.queued = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @asynccontextmanager
+    async def slot(self):
+        """Место среди concurrency одновременных запросов и токен на первую попытку.
+
+        Ожидание места и ожидание токена — одна очередь: вместе они не дольше
+        timeout, а в AI_QUEUE_WAIT и stats() попадает их сумма.
+        """
+        started = time.monotonic()
+        queued = self._slots.locked()
+        if queued:
+            self._slot_waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                raise self._reject() from None
+            finally:
+                self._slot_waiting -= 1
+        else:
+            await self._slots.acquire()
+        try:
+            queued = await self._take(started + self.timeout) or queued
+            self._admitted(started, queued)
+            yield
+        finally:
+            self._slots.release()
+
+    async def acquire(self) -> float:
+        """Токен для повторной попытки под уже занятым slot(); время ожидания, сек."""
+        started = time.monotonic()
+        queued = await self._take(started + self.timeout)
+        return self._admitted(started, queued)
+
+    async def _take(self, deadline: float) -> bool:
+        """Забирает токен, ожидая не дольше deadline; True, если ждал в очереди."""
+        if self.rate <= 0:
+            return False
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._schedule()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._waiters.remove(future)
+                future.cancel()
+                raise self._reject() from None
+        except asyncio.CancelledError:
+            if not future.done():
+                self._waiters.remove(future)
+            raise
+        return True
+
+    def _admitted(self, started: float, queued: bool) -> float:
+        waited = time.monotonic() - started if queued else 0.0
+        self.acquired += 1
+        if queued:
+            self.queued += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        AI_QUEUE_WAIT.observe(waited)
+        return waited
+
+    def _reject(self) -> RateLimitExceeded:
+        self.queued += 1
+        self.rejected += 1
+        return RateLimitExceeded(self.OVERLOADED)
+
+    def _schedule(self):
+        if self._wakeup is not None or not self._waiters:
+            return
+        delay = max(0.0, (1 - self._tokens) / self.rate)
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._wakeup = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            self._waiters.popleft().set_result(None)
+        self._schedule()
+
+    def stats(self) -> dict:
+        return {
+            "acquired": self.acquired,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "waiting": len(self._waiters) + self._slot_waiting,
+            "wait_avg": self.wait_total / (self.queued - self.rejected) if self.queued > self.rejected else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+
+# ===== Лимиты на пользователя =====
+class UserLimiter:
+    """Token bucket и дневная квота на каждого пользователя.
+
+    На пользователя хранится кортеж (токены, время) и счётчик за день;
+    полностью восстановившиеся корзины удаляются, поэтому память растёт
+    только с числом активных пользователей. per_minute <= 0 — без
+    поминутного лимита, daily_quota = 0 — без дневного.
+    """
+
+    CLEANUP_EVERY = 1000  # проверок между чистками
+
+    def __init__(self, per_minute: float = USER_RATE_PER_MINUTE, burst: int = USER_RATE_BURST,
+                 daily_quota: int = USER_DAILY_QUOTA):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.daily_quota = daily_quota
+        self._buckets: dict[int, tuple[float, float]] = {}
+        self._daily: dict[int, int] = {}
+        self._day = date.today()
+        self._checks = 0
+        self.rejected_rate = 0
+        self.rejected_quota = 0
+
+    def check(self, user_id: int) -> str | None:
+        """None, если вопрос можно задать, иначе текст отказа для пользователя."""
+        now = time.monotonic()
+        self._checks += 1
+        if self._checks % self.CLEANUP_EVERY == 0:
+            self._cleanup(now)
+
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self._daily.clear()
+        if self.daily_quota and self._daily.get(user_id, 0) >= self.daily_quota:
+            self.rejected_quota += 1
+            return "Вы исчерпали лимит вопросов ИИ-юристу на сегодня. Попробуйте завтра или свяжитесь с юристом."
+
+        if self.rate > 0:
+            tokens, updated = self._buckets.get(user_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self.rejected_rate += 1
+                wait = (1 - tokens) / self.rate
+                return f"Слишком много вопросов подряд. Попробуйте через {wait:.0f} с."
+            self._buckets[user_id] = (tokens - 1, now)
+
+        self._daily[user_id] = self._daily.get(user_id, 0) + 1
+        return None
+
+    def _cleanup(self, now: float):
+        full = [user_id for user_id, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for user_id in full:
+            del self._buckets[user_id]
+
+    def stats(self) -> dict:
+        return {
+            "rejected_rate": self.rejected_rate,
+            "rejected_quota": self.rejected_quota,
+            "active_users": len(self._buckets),
+        }
+
+
+deepseek_limiter = FairTokenBucket()
+user_limiter = UserLimiter()
@@ -0,0 +1,35 @@
+import re
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+# Служебные слова, которые не несут смысла для сравнения вопросов.
+# Отрицания («не», «ни») и модальные слова («можно», «нужно») сюда не входят:
+# «можно ли не платить» и «можно ли платить» — разные вопросы с разными ответами.
+STOP_WORDS = frozenset("""
+а и или но да же ли бы в во на по о об от до из за для при с со у к ко
+что как какой какие какая каком это этот эта эти мне меня мой моя мои я ты вы
+он она они его ее их моей мою моего моем моим есть
+""".split())
+
+# Отрицания и модальность: вопросы, которые различаются этими словами,
+# не считаются похожими, как бы ни совпадало остальное
+MEANING_WORDS = frozenset("""
+не ни нет нельзя можно нужно нужны надо должен должна обязан обязана
+""".split())
+
+STEM_LENGTH = 6
+
+
+def normalize_text(text: str) -> str:
+    """Нижний регистр, ё -> е, без пунктуации и лишних пробелов."""
+    text = text.lower().replace("ё", "е")
+    return " ".join(_NON_WORD.sub(" ", text).replace("_", " ").split())
+
+
+def tokenize(text: str) -> list[str]:
+    """Значимые слова текста, обрезанные до грубой основы.
+
+    Обрезка до первых STEM_LENGTH букв склеивает падежные формы
+    («квартира», «квартирой») без словарей и морфологических библиотек.
+    """
+    return [word[:STEM_LENGTH] for word in normalize_text(text).split() if word not in STOP_WORDS]
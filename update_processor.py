@@ -0,0 +1,62 @@
+import logging
+from collections import deque
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Апдейты разных чатов обрабатываются параллельно, одного чата — по очереди.
+
+    ConversationHandler выбирает обработчик по сохранённому состоянию
+    диалога: если второй апдейт пользователя начнётся раньше, чем закончится
+    первый, он увидит старое состояние («500000» попадёт в главное меню, а
+    не в калькулятор). Поэтому пока апдейт чата обрабатывается, следующие
+    апдейты этого чата ждут в его очереди и выполняются тем же слотом
+    concurrent_updates: один пользователь не занимает больше одного слота.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._pending: dict[int, deque] = {}  # чат -> ждущие корутины
+
+    async def do_process_update(self, update: object, coroutine):
+        chat_id = _chat_id(update)
+        if chat_id is None:
+            await coroutine
+            return
+        pending = self._pending.get(chat_id)
+        if pending is not None:
+            pending.append(coroutine)
+            return
+
+        self._pending[chat_id] = pending = deque([coroutine])
+        try:
+            while pending:
+                try:
+                    await pending[0]
+                except Exception:
+                    logger.exception("Ошибка обработки апдейта чата %s", chat_id)
+                pending.popleft()
+        finally:
+            del self._pending[chat_id]
+            # Отменили посреди очереди (остановка бота): не оставляем корутины невызванными
+            for rest in pending:
+                rest.close()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+def _chat_id(update: object) -> int | None:
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
@@ -0,0 +1,80 @@
+import logging
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import Application
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+# ===== ASGI-приложение: приём апдейтов и проверка здоровья =====
+def create_app(application: Application, secret: str | None = WEBHOOK_SECRET,
+               path: str = WEBHOOK_PATH) -> Starlette:
+    # Без секрета любой, кто знает адрес, может слать боту поддельные апдейты
+    if not secret:
+        raise ValueError("Для BOT_MODE=webhook задайте WEBHOOK_SECRET")
+
+    async def telegram(request: Request) -> Response:
+        if request.headers.get(SECRET_HEADER) != secret:
+            return Response(status_code=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return Response(status_code=400)
+        # Апдейт только кладём в очередь: Telegram получает 200 сразу,
+        # обработка идёт в фоне так же, как при polling
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return Response()
+
+    async def health(request: Request) -> Response:
+        return JSONResponse(
+            {"status": "ok" if application.running else "starting",
+             "pending_updates": application.update_queue.qsize()},
+            status_code=200 if application.running else 503,
+        )
+
+    return Starlette(routes=[
+        Route(path, telegram, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+    ])
+
+
+# ===== Запуск в режиме webhook =====
+async def run_webhook(application: Application, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT):
+    """Поднимает встроенный HTTP-сервер и регистрирует webhook в Telegram.
+
+    post_init/post_stop/post_shutdown вызываются вручную: их запускает только
+    run_polling/run_webhook самого PTB.
+    """
+    if not WEBHOOK_URL:
+        raise ValueError("Для BOT_MODE=webhook задайте WEBHOOK_URL")
+    if not WEBHOOK_SECRET:
+        raise ValueError("Для BOT_MODE=webhook задайте WEBHOOK_SECRET")
+
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(application), host=host, port=port, log_level="warning", use_colors=False,
+    ))
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        await application.start()
+        logger.info("Webhook слушает %s:%d%s", host, port, WEBHOOK_PATH)
+        try:
+            await server.serve()
+        finally:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)